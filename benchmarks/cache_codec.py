@@ -0,0 +1,123 @@
+"""
+Compares cache codecs on values shaped like what each cache namespace stores.
+
+    python -m benchmarks.cache_codec [--redis]
+
+For every namespace and codec it prints the encode / decode time and the encoded size.
+With --redis it also reports what the live `cache:*` keys actually take up in redis
+(MEMORY USAGE), summed per namespace.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+
+from utils import codec as c
+from utils.cache import fields
+
+CODECS = {'json': c.Codec('json', compress_threshold=None),
+          'json+zlib': c.Codec('json')}
+if c.msgpack is not None:
+    CODECS['msgpack'] = c.Codec('msgpack', compress_threshold=None)
+    CODECS['msgpack+zlib'] = c.Codec('msgpack')
+
+
+def sample_values() -> dict:
+    """ Stand-ins for each namespace, built from the data files where possible """
+    with open('data/item-data.json') as f:
+        items = json.load(f)
+
+    rand = random.Random(0)
+    osrs_prices = {x['id']: {'id': int(x['id']), 'name': x['name'], 'members': rand.random() > 0.5,
+                             'sp': rand.randint(1, 10 ** 6), 'buy_average': rand.randint(0, 10 ** 7),
+                             'buy_quantity': rand.randint(0, 10 ** 4), 'sell_average': rand.randint(0, 10 ** 7),
+                             'sell_quantity': rand.randint(0, 10 ** 4), 'overall_average': rand.randint(0, 10 ** 7),
+                             'overall_quantity': rand.randint(0, 10 ** 4)}
+                   for x in items.values()}
+
+    articles = [{'author': 'Some Reporter', 'title': f'Headline number {i} about something happening',
+                 'description': 'A sentence or two summarising the article. ' * 3,
+                 'url': f'https://www.example.com/news/2019/06/{i}/some-long-article-slug',
+                 'urlToImage': f'https://cdn.example.com/images/{i}.jpg', 'publishedAt': '2019-06-19T12:00:00Z'}
+                for i in range(10)]
+
+    champ_info = [{'role': role, 'percentRolePlayed': rand.random(), 'playRate': rand.random() / 10,
+                   'winRate': rand.random(), 'banRate': rand.random() / 10, 'championId': 1}
+                  for role in ('TOP', 'MIDDLE', 'JUNGLE')]
+
+    patch_notes = {'color': 3066993, 'type': 'rich', 'description': 'Patch summary text. ' * 50,
+                   'image': {'url': 'https://na.leagueoflegends.com/sites/default/files/patch.jpg'},
+                   'author': {'name': 'LoL Patch Notes', 'url': 'https://na.leagueoflegends.com/en/news/patch-9-12',
+                              'icon_url': 'http://2.bp.blogspot.com/icon.png'}}
+
+    # What's actually cached since the cogs declare projections (see cogs/osrs.project_prices)
+    price_fields = fields('buy_average', 'sell_average', 'buy_quantity', 'sell_quantity')
+    projected_prices = {k: price_fields(v) for k, v in osrs_prices.items()}
+
+    return {'osrs_prices': osrs_prices,
+            'osrs_prices/p': projected_prices,
+            'news': articles,
+            'champ_info': champ_info,
+            'league_pnotes': patch_notes,
+            'ask': [f'https://www.example.com/result/{i}' for i in range(10)],
+            'btc': {'price_usd': '9270.1', 'last_updated': '1560945000'}}
+
+
+def timeit(func, *args, repeat: int) -> float:
+    """ Best of 3 runs, in microseconds per call """
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func(*args)
+        best = min(best, (time.perf_counter() - start) / repeat)
+
+    return best * 10 ** 6
+
+
+def run_codecs():
+    print(f'{"namespace":<14} {"codec":<13} {"encode us":>10} {"decode us":>10} {"bytes":>9}')
+    for namespace, value in sample_values().items():
+        # Fewer repeats for the big values so the whole run stays quick
+        repeat = 20 if namespace.startswith('osrs_prices') else 2000
+        for name, codec in CODECS.items():
+            encoded = codec.encode(value)
+            assert codec.decode(encoded) == json.loads(json.dumps(value))
+
+            enc = timeit(codec.encode, value, repeat=repeat)
+            dec = timeit(codec.decode, encoded, repeat=repeat)
+            print(f'{namespace:<14} {name:<13} {enc:>10.1f} {dec:>10.1f} {len(encoded):>9}')
+        print()
+
+
+async def redis_usage():
+    """ Sums MEMORY USAGE of the live cache keys per namespace """
+    import aredis
+    redis = aredis.StrictRedis(host='localhost')
+
+    usage = defaultdict(int)
+    counts = defaultdict(int)
+    async for key in redis.scan_iter(match='cache:*'):
+        namespace = key.decode().split(':')[1]
+        usage[namespace] += await redis.execute_command('MEMORY USAGE', key) or 0
+        counts[namespace] += 1
+
+    print(f'{"namespace":<14} {"keys":>6} {"bytes":>10}')
+    for namespace in sorted(usage, key=usage.get, reverse=True):
+        print(f'{namespace:<14} {counts[namespace]:>6} {usage[namespace]:>10}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the cache codecs')
+    parser.add_argument('--redis', action='store_true', help='Also report memory used by the live cache keys')
+    args = parser.parse_args()
+
+    run_codecs()
+    if args.redis:
+        asyncio.get_event_loop().run_until_complete(redis_usage())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""
+Compares streaming extraction (utils/html_stream.py) with building a whole BeautifulSoup tree.
+
+    python -m benchmarks.html_extract [--chunk 16384] [--file page.html --selector 'div#content']
+
+For each scraper it prints the bytes each approach has to read and the CPU time it takes to get
+the same values out of a page shaped like the real one: the elements the cog wants somewhere near
+the top, followed by the usual pile of markup and scripts. The body is fed to the extractor in
+`--chunk` sized pieces, like it arrives off the network. --file benchmarks a saved page instead.
+"""
+import argparse
+import random
+import time
+
+from bs4 import BeautifulSoup
+
+from utils.html_stream import Extractor, Target
+
+
+def filler(rand: random.Random, size: int) -> str:
+    """ Nested markup, links and inline scripts, about `size` characters of it """
+    parts = []
+    total = 0
+    while total < size:
+        n = rand.randint(0, 10 ** 6)
+        part = (f'<div class="card c{n % 7}"><ul>' + ''.join(f'<li><a href="/p/{n + i}">Item {i}</a></li>'
+                                                              for i in range(5))
+                + f'</ul><p>Some text {n} to pad things out a bit.</p>'
+                + f'<script>var x{n} = {{"k": [{n}, {n + 1}]}};</script></div>')
+        parts.append(part)
+        total += len(part)
+
+    return ''.join(parts)
+
+
+def page(rand: random.Random, body: str, tail_size: int, lead: int = 4000) -> str:
+    return (f'<!DOCTYPE html><html><head><title>t</title>{filler(rand, lead // 2)}</head><body>'
+            f'{filler(rand, lead)}{body}{filler(rand, tail_size)}</body></html>')
+
+
+def soup_weather(html):
+    soup = BeautifulSoup(html, 'lxml')
+    return [soup.find('div', class_=c).text for c in ('wtr_locTitle', 'wtr_currTemp', 'wtr_currPerci',
+                                                      'wtr_caption', 'wtr_currWind', 'wtr_currHumi')] + \
+        [soup.find('img', class_='wtr_currImg')['src']] + \
+        [x['aria-label'] for x in soup.find_all('div', class_='wtr_forecastDay')]
+
+
+def soup_ask(html):
+    soup = BeautifulSoup(html, 'lxml')
+    return [a['href'] for a in soup.find_all('a', {'class': 'result-link'}, href=True)]
+
+
+def soup_meme(html):
+    soup = BeautifulSoup(html, 'lxml')
+    return [tr.h2.a['href'] for tr in soup.find_all('tr') if tr.h2 is not None][:1]
+
+
+def soup_isup(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    return str(soup.find('p')).split('>')[1].strip().split('<')[0]
+
+
+def soup_fact(html):
+    soup = BeautifulSoup(html, 'lxml')
+    return soup.find('div', id='content').text
+
+
+def soup_patch_index(html):
+    soup = BeautifulSoup(html, 'lxml')
+    return soup.find('h4').a['href'], soup.find('img', attrs={'typeof': 'foaf:Image'})['src']
+
+
+def soup_patch_page(html):
+    soup = BeautifulSoup(html, 'lxml')
+    return soup.find('blockquote').text
+
+
+def scrapers() -> dict:
+    """ name: (page, targets, the old full-tree parse) """
+    rand = random.Random(0)
+    weather = ('<div class="wtr_locTitle">Seattle, Washington</div><div class="wtr_currTemp">57</div>'
+               '<img class="wtr_currImg" src="/th?id=cloudy.png"><div class="wtr_caption">Cloudy</div>'
+               '<div class="wtr_currPerci">Precipitation: 10%</div><div class="wtr_currWind">Wind: 5 mph</div>'
+               '<div class="wtr_currHumi">Humidity: 80%</div>'
+               + ''.join(f'<div class="wtr_forecastDay" aria-label="Day {i} 60° 50°"></div>' for i in range(2)))
+    ask = ''.join(f'<div class="result"><a class="result-link" href="https://example.com/{i}">r</a></div>'
+                  for i in range(10))
+
+    # The same as cogs.weather.Weather.TARGETS, without importing discord.py
+    weather_targets = {'loc': 'div.wtr_locTitle', 'temp': 'div.wtr_currTemp', 'precip': 'div.wtr_currPerci',
+                       'img_url': Target('img.wtr_currImg', attr='src'), 'curr_cond': 'div.wtr_caption',
+                       'wind': 'div.wtr_currWind', 'humidity': 'div.wtr_currHumi',
+                       'forecast': Target('div.wtr_forecastDay', attr='aria-label', limit=2)}
+
+    return {
+        'weather': (page(rand, weather, 250000), weather_targets, soup_weather),
+        'ask': (page(rand, ask, 120000), {'links': Target('a.result-link', attr='href', limit=10)}, soup_ask),
+        'meme': (page(rand, '<table><tr><td><h2><a href="/memes/x">x</a></h2></td></tr></table>', 150000),
+                 {'link': Target('tr h2 a', attr='href')}, soup_meme),
+        'isup': (page(rand, '<p>It\'s just you. <a href="//x.com">x.com</a> is up.</p>', 20000, lead=0),
+                 {'result': Target('p', own_text=True)}, soup_isup),
+        'fact': (page(rand, '<div id="content"> Bananas are berries. </div>', 15000), {'fact': 'div#content'},
+                 soup_fact),
+        'patch_index': (page(rand, '<h4><a href="/en/news/patch-9-12">9.12</a></h4>'
+                                   '<img typeof="foaf:Image" src="/files/patch.jpg">', 200000),
+                        {'link': Target('h4 a', attr='href'), 'image': Target('img[typeof=foaf:Image]', attr='src')},
+                        soup_patch_index),
+        'patch_page': (page(rand, '<blockquote>' + 'Patch summary text. ' * 40 + '</blockquote>', 300000),
+                       {'summary': 'blockquote'}, soup_patch_page),
+    }
+
+
+def stream(data: bytes, targets: dict, chunk: int):
+    extractor = Extractor(targets)
+    for i in range(0, len(data), chunk):
+        if extractor.feed(data[i:i + chunk]):
+            break
+
+    return extractor.bytes_read, extractor.results()
+
+
+def cpu_time(func, *args, repeat: int) -> float:
+    """ Best of 3 runs, in CPU milliseconds per call """
+    best = float('inf')
+    for _ in range(3):
+        start = time.process_time()
+        for _ in range(repeat):
+            func(*args)
+        best = min(best, (time.process_time() - start) / repeat)
+
+    return best * 1000
+
+
+def run(pages: dict, chunk: int, repeat: int):
+    print(f'{"scraper":<12} {"page bytes":>10} {"read":>10} {"soup ms":>8} {"stream ms":>9} {"speedup":>8}')
+    for name, (html, targets, full_parse) in pages.items():
+        data = html.encode()
+        read, _ = stream(data, targets, chunk)
+
+        full = cpu_time(full_parse, html, repeat=repeat)
+        # The soup approach decodes the whole body as well, so the stream gets the bytes
+        streamed = cpu_time(stream, data, targets, chunk, repeat=repeat)
+        print(f'{name:<12} {len(data):>10} {read:>10} {full:>8.2f} {streamed:>9.2f} {full / streamed:>7.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark streaming HTML extraction')
+    parser.add_argument('--chunk', type=int, default=16384, help='Bytes fed to the parser at a time')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--file', help='A saved page to benchmark instead of the generated ones')
+    parser.add_argument('--selector', help='What to extract from --file (its first match\'s text)')
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding='utf-8', errors='replace') as f:
+            html = f.read()
+        selector = args.selector or 'title'
+        # Only compares against building the tree, the soup equivalent of a selector isn't derived
+        pages = {'file': (html, {'value': selector}, lambda h: BeautifulSoup(h, 'lxml'))}
+    else:
+        pages = scrapers()
+
+    run(pages, args.chunk, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
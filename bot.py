@@ -1,19 +1,50 @@
 import json
+import time
 import traceback
 from datetime import datetime
+from functools import partial
 from pathlib import Path
 
-import aiohttp
-import aredis
 import asyncpg
 from discord.ext import commands
 
+from utils import cog_manifest
+from utils import deadline
+from utils import ipc
+from utils import memory
+from utils import metrics
+from utils import tracing
+from utils.cache import Cache
+from utils.cpu_pool import CPUPool
+from utils.codec import Codec
 from utils.custom_context import CustomContext
+from utils.guild_settings import GuildSettings
+from utils.http_client import HTTPClient
+from utils.prefilter import MessagePrefilter
+from utils.ratelimit import RateLimiter
+from utils.remote_cogs import RemoteCogs
+from utils.search import HedgedSearch
+from utils.startup import StartupPipeline
+from utils.watchdog import LoopWatchdog
 
 
-class QTBot(commands.Bot):
-    def __init__(self, config_file, *args, **kwargs):
+class QTBot(commands.AutoShardedBot):
+    # Static data files shared by the cogs, parsed once at startup
+    DATA_FILES = {'champ_data': 'data/champ_data.json',
+                  'item_data': 'data/item-data.json',
+                  'xkcd_comics': 'data/xkcd_comics.json',
+                  'xkcd_blob': 'data/xkcd_blob.json'}
+
+    def __init__(self, config_file, *args, lazy_load=False, cluster_id=None, trace_memory=False, remote_cogs=(),
+                 cog_workers=0, **kwargs):
+        # Before anything else is loaded, so data files and cogs are attributed (see qt.memory)
+        if trace_memory:
+            memory.start_tracing()
+
         self.config_file = config_file
+        self.lazy_load = lazy_load
+        # Set when this process is one worker of a sharded cluster (see launcher.py)
+        self.cluster_id = cluster_id
         self.description = 'qtbot is a big qt written in python3 and love.'
         self.do_not_load = ('league')
 
@@ -25,52 +56,222 @@ class QTBot(commands.Bot):
         super().__init__(command_prefix=self.get_prefix, description=self.description,
                          pm_help=None, case_insensitive=True, *args, **kwargs)
 
-        self.aio_session = aiohttp.ClientSession(loop=self.loop)
+        self.metrics = metrics.registry
+        self.tracer = tracing.tracer
         # self.rune_client = lolrune.AioRuneClient()
-        self.redis_client = aredis.StrictRedis(host='localhost', decode_responses=True)
+        self.redis_client = metrics.InstrumentedRedis(host='localhost', decode_responses=True)
+        self.ratelimiter = RateLimiter(self.redis_client, limits=self.api_keys.get('rate_limits'))
+        # Not `self.http`, discord.py already uses that name
+        self.http_client = HTTPClient.from_config(self.loop, self.api_keys, ratelimiter=self.ratelimiter)
+        # Used by qt.google, asks a fallback engine whenever the first one is slow
+        self.web_search = HedgedSearch.from_config(self.http_client, self.api_keys)
+        # The cache stores binary values, so it needs a client which doesn't decode them
+        self.cache = Cache(metrics.InstrumentedRedis(host='localhost'), ttls=self.api_keys.get('cache_ttls'),
+                           codec=Codec(**self.api_keys.get('cache_codec', {})))
+        # Seconds each command has to answer in, see utils.deadline
+        self.command_deadline = self.api_keys.get('command_deadline', deadline.DEFAULT_BUDGET)
+        self.command_deadlines = self.api_keys.get('command_deadlines', {})
         self.startup_extensions = [x.stem for x in Path('cogs').glob('*.py')]
-        self.loop.run_until_complete(self.create_db_pool())
-        self.loop.run_until_complete(self.load_all_prefixes())
+        # Cogs whose commands are forwarded to cog worker processes instead of loaded here (see cog_worker.py)
+        self.remote_cogs = None
+        if remote_cogs and cog_workers:
+            ipc_dir = self.api_keys.get('ipc_dir', '/tmp')
+            self.remote_cogs = RemoteCogs(self, remote_cogs, [ipc.socket_path(ipc_dir, i) for i in range(cog_workers)])
+        # Maps command names / aliases -> extension so cogs can be loaded on first use
+        self.command_manifest = {}
+        if self.lazy_load:
+            self.command_manifest = {k: v for k, v in cog_manifest.build_manifest().items()
+                                     if v.split('.')[-1] not in self.do_not_load and not self.is_remote(v)}
+        self.data = {}
+        # Fuzzy matching and parsing runs here instead of on the event loop
+        self.cpu_pool = CPUPool(self.loop, {name: self.DATA_FILES[name] for name in ('item_data', 'xkcd_blob')},
+                                workers=self.api_keys.get('cpu_pool_workers', 2))
+        self.guild_settings = GuildSettings(self, default_prefix='qt.')
+        self.prefilter = MessagePrefilter(self.guild_settings)
+        self.add_collectors()
+        self.loop.run_until_complete(self.startup())
+
+    def add_collectors(self):
+        """ Exports the stats of everything this process uses as metrics """
+        self.metrics.add_collector(
+            lambda: [('qtbot_messages_total', {'result': k}, v) for k, v in self.prefilter.stats.items()])
+        self.add_backend_collectors()
+        self.metrics.add_collector(
+            lambda: [('qtbot_cog_worker_inflight', {'worker': str(w.worker_id)}, len(w.inflight))
+                     for w in (self.remote_cogs.workers if self.remote_cogs else ())])
+
+    def add_backend_collectors(self):
+        """ The stats of the clients commands use, which cog workers export as well """
+        self.metrics.add_collector(
+            lambda: [('qtbot_cache_total', {'result': k}, v) for k, v in self.cache.stats.items()])
+        self.metrics.add_collector(
+            lambda: [('qtbot_circuit_open', {'host': host}, int(breaker.state != 'closed'))
+                     for host, breaker in self.http_client.breakers.items()])
+        self.metrics.add_collector(
+            lambda: [('qtbot_ratelimit_total', {'name': name, 'result': result}, v)
+                     for (name, result), v in self.ratelimiter.usage.items()])
+        self.metrics.add_collector(
+            lambda: [('qtbot_search_total', {'engine': engine, 'result': result}, v)
+                     for (engine, result), v in self.web_search.stats.items()])
+        self.metrics.add_collector(lambda: [('qtbot_cpu_pool_queued', {}, self.cpu_pool.queued)])
 
     def run(self):
         super().run(self.token)
 
-    async def load_all_prefixes(self):
-        pres = await self.pg_con.fetch('SELECT * from custom_prefix')
-        # Load custom prefixes into a dict
-        self.pre_dict = {r['guild_id']: r['prefix'] for r in pres}
+    async def close(self):
+        await super().close()
+        await self.http_client.close()
+        self.cpu_pool.shutdown()
+
+    async def startup(self):
+        """ Brings up the backends and parses the data files concurrently, then reports how long each took """
+        await self.run_startup_pipeline(self.DATA_FILES)
+
+        # Keeps guild settings in sync with the other bot processes
+        self.loop.create_task(self.guild_settings.listen())
+
+        if self.remote_cogs is not None:
+            self.remote_cogs.start()
+
+    async def run_startup_pipeline(self, data_files):
+        """ Runs the startup stages of the backends and of `data_files` (unless lazy) and prints the report """
+        pipeline = StartupPipeline(self.loop)
+        pipeline.add_stage('postgres', self.create_db_pool)
+        pipeline.add_stage('redis', self.redis_client.ping, required=False)
+        pipeline.add_stage('metrics', self.start_metrics_server, required=False)
+        pipeline.add_stage('cpu_pool', self.cpu_pool.warm_up, required=False)
+
+        # Lazy mode leaves data files to whichever cog needs them first
+        if not self.lazy_load:
+            for name in data_files:
+                pipeline.add_stage(f'data:{name}', partial(self.load_data, name), required=False)
+
+        await pipeline.run()
+        print(pipeline.report())
+
+    @staticmethod
+    def _read_json(path: str):
+        with open(path, encoding='utf8') as f:
+            return json.load(f)
+
+    async def load_data(self, name: str):
+        """ Parses a data file off the event loop and stores it in self.data """
+        self.data[name] = await self.loop.run_in_executor(None, self._read_json, self.DATA_FILES[name])
+
+    def get_data(self, name: str):
+        """ Returns a parsed data file, reusing the copy parsed at startup if there is one """
+        if name not in self.data:
+            self.data[name] = self._read_json(self.DATA_FILES[name])
+
+        return self.data[name]
+
+    async def start_metrics_server(self):
+        """ Serves Prometheus metrics on localhost -- cluster workers each get their own port """
+        port = self.api_keys.get('metrics_port', 9100) + (self.cluster_id or 0)
+        self.metrics_runner = await self.metrics.serve('127.0.0.1', port)
 
     async def get_prefix(self, message):
-        try:
-            return ('qt.', self.pre_dict[message.guild.id])
-        except (KeyError, AttributeError):
-            return 'qt.'
+        return await self.guild_settings.prefixes(message.guild and message.guild.id)
 
     async def create_db_pool(self):
-        with open(self.config_file) as f:
-            self.pg_pw = json.load(f)['postgres']
-        self.pg_con = await asyncpg.create_pool(user='james', password=self.pg_pw, database='discord_testing')
+        self.pg_pw = self.api_keys['postgres']
+        pool = await asyncpg.create_pool(user='james', password=self.pg_pw, database='discord_testing')
+        self.pg_con = metrics.TimedPool(pool)
+
+    def is_remote(self, extension: str) -> bool:
+        """ Whether `extension` runs in the cog workers rather than in this process """
+        return self.remote_cogs is not None and extension.split('.')[-1] in self.remote_cogs.cogs
+
+    def load_lazy_extension(self, invoked_with: str) -> bool:
+        """ Loads the extension owning `invoked_with` if it isn't loaded yet
+        Returns whether a new extension was loaded """
+        extension = self.command_manifest.get(invoked_with.lower())
+        if extension is None or extension in self.extensions:
+            return False
+
+        try:
+            self.load_extension(extension)
+        except:
+            print(f'Failed Extension: {extension}')
+            traceback.print_exc()
+            return False
+
+        print(f'Lazily Loaded Extension: {extension}')
+        return True
 
     async def on_message(self, message):
+        started_at = time.perf_counter()
+
+        # Drop bot messages and normal chat before any Context is allocated
+        if not await self.prefilter.check(message):
+            return
+
         ctx = await self.get_context(message, cls=CustomContext)
+
+        # In lazy mode the first use of a command imports and sets up its cog
+        if ctx.command is None and ctx.invoked_with and self.load_lazy_extension(ctx.invoked_with):
+            ctx = await self.get_context(message, cls=CustomContext)
+
+        ctx.started_at = started_at
+
+        # Commands of the remote cogs run in a cog worker, which sends its replies through this process
+        if ctx.command is None and ctx.invoked_with and self.remote_cogs is not None \
+                and self.remote_cogs.handles(ctx.invoked_with):
+            name = await self.remote_cogs.forward(ctx)
+            if name is not None:
+                self.metrics.observe('command', name, (ctx.last_sent_at or time.perf_counter()) - started_at)
+            return
+
+        if ctx.command is None:
+            return await self.invoke(ctx)
+
+        # Every DB / cache / HTTP / parse step from here on is recorded as a span of this trace
+        ctx.trace = self.tracer.start(ctx.command.qualified_name, started_at)
+        dispatch = tracing.Span('dispatch', 'prefilter + context', started_at)
+        dispatch.end = time.perf_counter()
+        ctx.trace.root.children.append(dispatch)
+
+        # Every DB / cache / HTTP call the command makes gives up once this passes
+        name = ctx.command.qualified_name
+        deadline.start(self.command_deadlines.get(name, self.command_deadline) - (time.perf_counter() - started_at))
+
         await self.invoke(ctx)
 
+        # Time up to the command's final reply (pagination can keep a command alive long after that)
+        finished_at = ctx.last_sent_at or time.perf_counter()
+        self.metrics.observe('command', ctx.command.qualified_name, finished_at - started_at)
+        self.tracer.finish(ctx.trace, finished_at)
+
     async def on_ready(self):
         if not hasattr(self, 'start_time'):
             self.start_time = datetime.now()
             self.start_time_str = self.start_time.strftime('%B %d %H:%M:%S')
 
+            # Watches for anything blocking the event loop (see qt.lag)
+            self.watchdog = LoopWatchdog(self.loop, threshold=self.api_keys.get('lag_threshold', 0.1))
+            self.watchdog.start()
+
         for extension in self.startup_extensions:
-            if extension not in self.do_not_load:
+            if f'cogs.{extension}' in self.extensions:
+                continue
+
+            # Lazy mode only loads the essentials, everything else waits for its first command
+            if self.lazy_load and extension not in cog_manifest.ALWAYS_LOAD:
+                continue
+
+            if extension not in self.do_not_load and not self.is_remote(extension):
+                start = time.perf_counter()
                 try:
                     self.load_extension(f'cogs.{extension}')
                 except:
                     print(f'Failed Extension: {extension}')
                     traceback.print_exc()
                 else:
-                    print(f'Loaded Extension: {extension}')
+                    print(f'Loaded Extension: {extension} ({time.perf_counter() - start:.3f}s)')
 
         print(f'Client logged in at {self.start_time_str}')
         print(self.user.name)
         print(self.user.id)
+        if self.cluster_id is not None:
+            print(f'Cluster {self.cluster_id}: shards {self.shard_ids} of {self.shard_count}')
         print('----------')
@@ -0,0 +1,322 @@
+import asyncio
+import os
+import time
+import traceback
+from collections import Counter
+
+import discord
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+from bot import QTBot
+from utils import cog_manifest
+from utils import deadline
+from utils import ipc
+from utils.custom_context import CustomContext
+from utils.watchdog import LoopWatchdog
+
+
+class RemoteError(discord.DiscordException):
+    """ The gateway couldn't do what a command asked of it (e.g. it's missing permissions) """
+
+
+class RemoteUser:
+    """ Stands in for the discord.User / Member a command was invoked by or reacted with """
+
+    def __init__(self, data: dict):
+        self.id = data['id']
+        self.name = data['name']
+        self.discriminator = data['discriminator']
+        self.display_name = data['display_name']
+        self.bot = data['bot']
+        self.avatar_url = data['avatar_url']
+
+    @property
+    def mention(self) -> str:
+        return f'<@{self.id}>'
+
+    def __str__(self):
+        return f'{self.name}#{self.discriminator}'
+
+    def __eq__(self, other):
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class RemoteGuild:
+    def __init__(self, data: dict):
+        self.id = data['id']
+        self.name = data['name']
+
+
+class RemoteChannel:
+    def __init__(self, invocation, id_: int):
+        self.invocation = invocation
+        self.id = id_
+
+    async def send(self, content=None, *, embed=None, delete_after=None):
+        return await self.invocation.send(content, embed=embed, delete_after=delete_after)
+
+    async def trigger_typing(self):
+        await self.invocation.call('typing')
+
+
+class RemoteMessage:
+    """ A message on the gateway's side, editing or reacting to it asks the gateway to """
+    _state = None
+
+    def __init__(self, invocation, id_: int, content: str = '', author=None, channel=None, guild=None):
+        self.invocation = invocation
+        self.id = id_
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = guild
+
+    async def edit(self, **fields):
+        if 'embed' in fields:
+            fields['embed'] = fields['embed'] and fields['embed'].to_dict()
+        await self.invocation.call('edit', message_id=self.id, **fields)
+
+    async def add_reaction(self, emoji):
+        await self.invocation.call('add_reaction', message_id=self.id, emoji=str(emoji))
+
+    async def remove_reaction(self, emoji, member):
+        await self.invocation.call('remove_reaction', message_id=self.id, emoji=str(emoji), user_id=member.id)
+
+    async def clear_reactions(self):
+        await self.invocation.call('clear_reactions', message_id=self.id)
+
+    async def delete(self):
+        await self.invocation.call('delete', message_id=self.id)
+
+
+class RemoteReaction:
+    def __init__(self, emoji: str, message: RemoteMessage):
+        self.emoji = emoji
+        self.message = message
+
+
+class RemoteContext(CustomContext):
+    """ A Context whose replies are sent by the gateway that forwarded the command
+
+    Only content, an embed and delete_after make it across, anything else (files, tts, ...) is a
+    TypeError rather than being dropped. """
+    invocation = None
+
+    async def send(self, content=None, *, embed=None, delete_after=None):
+        message = await self.invocation.send(content, embed=embed, delete_after=delete_after)
+        self.last_sent_at = time.perf_counter()
+
+        return message
+
+    async def trigger_typing(self):
+        await self.invocation.call('typing')
+
+
+class GatewayConnection:
+    """ One gateway process connected to this worker """
+
+    def __init__(self, writer):
+        self.writer = writer
+        # (invocation id, call number) -> future of the gateway's result
+        self.pending = {}
+        # Invocation id -> the task running it
+        self.invocations = {}
+        self.closed = False
+
+    def send(self, message: dict):
+        if not self.closed:
+            ipc.write_message(self.writer, message)
+
+    def close(self):
+        self.closed = True
+        self.writer.close()
+        for task in self.invocations.values():
+            task.cancel()
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(RemoteError('The gateway went away'))
+
+
+class Invocation:
+    """ One command forwarded by a gateway, everything it does on Discord goes back as a call
+
+    Each call waits at most `timeout` seconds (the command's deadline budget) for the gateway's
+    answer. Not the deadline itself, paginators keep editing their message long after it. """
+
+    def __init__(self, connection: GatewayConnection, id_: int, timeout: float = deadline.DEFAULT_BUDGET):
+        self.connection = connection
+        self.id = id_
+        self.timeout = timeout
+        self.calls = 0
+
+    async def call(self, action: str, **fields):
+        self.calls += 1
+        key = self.id, self.calls
+        future = self.connection.pending[key] = asyncio.get_event_loop().create_future()
+        self.connection.send({'op': 'call', 'id': self.id, 'call': self.calls, 'action': action, **fields})
+
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            raise RemoteError(f'The gateway didn\'t answer `{action}` in time') from None
+        finally:
+            self.connection.pending.pop(key, None)
+
+    async def send(self, content=None, embed=None, delete_after=None) -> RemoteMessage:
+        message_id = await self.call('send', content=content, embed=embed and embed.to_dict(),
+                                     delete_after=delete_after)
+        return RemoteMessage(self, message_id, content=content or '')
+
+
+class CogWorker(QTBot):
+    """ Runs the commands of `remote_cogs` for the gateway processes (see utils/remote_cogs.py)
+
+    It never connects to Discord itself: gateways send it whole invocations over a unix socket, it
+    parses and runs them just like QTBot.on_message would, and every send / edit / reaction is a
+    call back to the gateway, which returns the id of the message it sent. Each worker has its own
+    metrics port (`cog_worker_metrics_port` + worker id) and answers `stats` with its load. """
+
+    def __init__(self, config_file, worker_id: int, remote_cogs=(), cog_workers=0, **kwargs):
+        self.worker_id = worker_id
+        self.cog_names = list(remote_cogs)
+        self.active = 0
+        self.worker_stats = Counter()
+        super().__init__(config_file, **kwargs)
+        self.socket_path = ipc.socket_path(self.api_keys.get('ipc_dir', '/tmp'), worker_id)
+
+    def add_collectors(self):
+        """ Only the backends' -- it doesn't see messages or run cog workers of its own """
+        self.add_backend_collectors()
+
+    async def startup(self):
+        """ Only the backends and the data files its own cogs read
+        Prefixes are matched by the gateway, so it doesn't keep guild settings in sync either """
+        await self.run_startup_pipeline(cog_manifest.data_files(self.cog_names) & self.DATA_FILES.keys())
+
+    async def start_metrics_server(self):
+        port = self.api_keys.get('cog_worker_metrics_port', self.api_keys.get('metrics_port', 9100) + 100)
+        self.metrics_runner = await self.metrics.serve('127.0.0.1', port + self.worker_id)
+
+    def run(self):
+        for extension in ('error', *self.cog_names):
+            if extension in self.do_not_load:
+                continue
+
+            try:
+                self.load_extension(f'cogs.{extension}')
+            except:
+                print(f'Failed Extension: {extension}')
+                traceback.print_exc()
+
+        self.watchdog = LoopWatchdog(self.loop, threshold=self.api_keys.get('lag_threshold', 0.1))
+        self.watchdog.start()
+
+        try:
+            self.loop.run_until_complete(self.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.loop.run_until_complete(self.close())
+
+    async def serve(self):
+        # A socket left behind by a worker which died
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        server = await asyncio.start_unix_server(self.handle_gateway, path=self.socket_path)
+        print(f'Cog worker {self.worker_id} (pid {os.getpid()}) serving {", ".join(self.cog_names)} '
+              f'on {self.socket_path}')
+        async with server:
+            await server.serve_forever()
+
+    async def handle_gateway(self, reader, writer):
+        connection = GatewayConnection(writer)
+        try:
+            while True:
+                message = await ipc.read_message(reader)
+                op = message['op']
+                if op == 'invoke':
+                    connection.invocations[message['id']] = self.loop.create_task(self.run_invocation(connection,
+                                                                                                      message))
+                elif op == 'result':
+                    future = connection.pending.pop((message['id'], message['call']), None)
+                    if future is None or future.done():
+                        continue
+                    if 'error' in message:
+                        future.set_exception(RemoteError(message['error']))
+                    else:
+                        future.set_result(message.get('result'))
+                elif op == 'reaction':
+                    # Only the message id matters to the cogs' wait_for checks
+                    reacted = RemoteMessage(None, message['message_id'])
+                    self.dispatch('reaction_add', RemoteReaction(message['emoji'], reacted),
+                                  RemoteUser(message['user']))
+                elif op == 'stats':
+                    connection.send({'op': 'stats', **self.load_report(),
+                                     'invocations': list(connection.invocations)})
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            connection.close()
+
+    def load_report(self) -> dict:
+        return {'pid': os.getpid(), 'cogs': self.cog_names, 'active': self.active,
+                'handled': self.worker_stats['handled'], 'errors': self.worker_stats['errors'],
+                'lag': self.watchdog.last_lag, 'max_lag': self.watchdog.max_lag}
+
+    async def run_invocation(self, connection: GatewayConnection, message: dict):
+        started_at = time.perf_counter()
+        invocation = Invocation(connection, message['id'])
+        msg = RemoteMessage(invocation, message['message_id'], content=message['content'],
+                            author=RemoteUser(message['author']),
+                            channel=RemoteChannel(invocation, message['channel_id']),
+                            guild=message['guild'] and RemoteGuild(message['guild']))
+
+        # The same parsing as Bot.get_context, the gateway has already matched the prefix
+        view = StringView(message['content'])
+        ctx = RemoteContext(prefix=message['prefix'], view=view, bot=self, message=msg)
+        ctx.invocation = invocation
+        ctx.started_at = started_at
+        view.skip_string(message['prefix'])
+        ctx.invoked_with = view.get_word()
+        ctx.command = self.all_commands.get(ctx.invoked_with)
+        if message['owner_id'] is not None:
+            self.owner_id = message['owner_id']
+
+        self.active += 1
+        try:
+            if ctx.command is not None:
+                name = ctx.command.qualified_name
+                invocation.timeout = self.command_deadlines.get(name, self.command_deadline)
+                deadline.start(invocation.timeout)
+                await self.invoke_remote(ctx)
+                self.metrics.observe('command', name, (ctx.last_sent_at or time.perf_counter()) - started_at)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self.active -= 1
+            self.worker_stats['handled'] += 1
+            connection.invocations.pop(message['id'], None)
+            connection.send({'op': 'done', 'id': message['id'],
+                             'command': ctx.command and ctx.command.qualified_name})
+
+    async def invoke_remote(self, ctx):
+        """ Bot.invoke, but errors are handled before it returns so their replies belong to the invocation """
+        try:
+            if await self.can_run(ctx, call_once=True):
+                await ctx.command.invoke(ctx)
+            else:
+                raise commands.CheckFailure('The global check once functions failed.')
+        except commands.CommandError as e:
+            self.worker_stats['errors'] += 1
+            handler = getattr(self.get_cog('ErrorHandler'), 'on_command_error', self.on_command_error)
+            await handler(ctx, e)
+
+
+def run_cog_worker(config_file: str, options: dict, worker_id: int):
+    """ Entry point of a cog worker process """
+    CogWorker(config_file, worker_id, **options).run()
@@ -1,13 +1,11 @@
-import ast
 import asyncio
 from typing import List
 
 import discord
-from bs4 import BeautifulSoup
 from discord.ext import commands
-from lxml import etree
 
-from utils import aiohttp_wrap as aw
+from utils import cpu_pool
+from utils.cache import NOT_FOUND, cached
 
 
 class Google(commands.Cog):
@@ -18,24 +16,17 @@ class Google(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        self.aio_session = bot.aio_session
-        self.redis_client = bot.redis_client
-        self.scrape_uri = 'http://www.ask.com/web?o=0&qo=homepageSearchBox'
-        self.headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 (KHTML, like Gecko) '
-                                      'Chrome/41.0.2228.0 Safari/537.36'}
+        self.http_client = bot.http_client
 
-    @staticmethod
-    def _get_ask_links(html):
-        """ Gets all result links from [REDACTED] """
-        soup = BeautifulSoup(html, 'lxml')
+    # Results are kept for 6 hrs, queries with no results for 10 minutes
+    @cached('ask', ttl=21600, negative_ttl=600)
+    async def search(self, query: str):
+        """ Returns the result links for a query, None if there weren't any (see utils.search) """
+        link_list = await self.bot.web_search.search(query)
+        if link_list is None:
+            return None
 
-        link_list = []
-
-        for link in soup.find_all('a', {'class': 'result-link'}, href=True):
-            if not link['href'].startswith('//'):
-                link_list.append(link['href'])
-
-        return link_list or None
+        return link_list or NOT_FOUND
 
     @commands.group(invoke_without_command=True, name='google', aliases=['g', 'ask'])
     async def _google(self, ctx, *, query):
@@ -45,21 +36,9 @@ class Google(commands.Cog):
         if not query:
             return await ctx.send('Feel free to search something.')
 
-        # Check if this has been searched in the cache
-        if await self.redis_client.exists(f'ask:{query}'):
-            link_list_str = await self.redis_client.get(f'ask:{query}')
-            link_list = ast.literal_eval(link_list_str)
-
-        # Actually request page html and store the link list for 6 hrs
-        else:
-            resp_html = await aw.aio_get_text(self.aio_session, self.scrape_uri, params={'q': query},
-                                              headers=self.headers)
-            link_list = self._get_ask_links(resp_html)
-
-            if link_list:
-                await self.redis_client.set(f'ask:{query}', f'{link_list}', ex=21600)
-            else:
-                return await ctx.error(f"Sorry, I couldn't find anything for `{query}`.")
+        link_list = await self.search(query)
+        if not link_list:
+            return await ctx.error(f"Sorry, I couldn't find anything for `{query}`.")
 
         if len(link_list) >= 3:
             await ctx.send(f'**Top result:**\n{link_list[0]}\n**See Also:**\n1. <{link_list[1]}>\n2. <{link_list[2]}>')
@@ -68,11 +47,8 @@ class Google(commands.Cog):
         else:
             await ctx.send(f'**Top result:**\n{link_list[0]}')
 
-    def _make_image_embed(self, query: str, html: str) -> List[discord.Embed]:
+    def _make_image_embed(self, query: str, link_list: list) -> List[discord.Embed]:
         """Helper method to create a list of embeds of the image results"""
-        root = etree.fromstring(html, etree.HTMLParser())
-        link_list = [x.get('href') for x in root.xpath('//div[@class="content"]//a[@class="thumb"]')]
-
         em_dict = {}
         for idx, link in enumerate(link_list[:5]):
             em = discord.Embed(title=f'Results for: `{query}`')
@@ -89,8 +65,9 @@ class Google(commands.Cog):
             return await ctx.error('You have to actually search for something.')
 
         params = {'q': query}
-        html = await aw.aio_get_text(self.aio_session, self.BING_URI, params=params, headers=self.BING_H)
-        em_dict = self._make_image_embed(query, html)
+        html = await self.http_client.get_text(self.BING_URI, params=params, headers=self.BING_H)
+        link_list = await self.bot.cpu_pool.run(cpu_pool.bing_image_links, html) if html else []
+        em_dict = self._make_image_embed(query, link_list)
 
         # Handle no results
         try:
@@ -1,18 +1,15 @@
 import discord
 import wolframalpha
-import json
 from discord.ext import commands
 
 
 class Calculator(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.api_key = bot.api_keys['wolfram']
 
-    def sync_calc(query):
+    def sync_calc(query, api_key):
         """ Non async wolfrmaalpha lib function """
-        with open('data/apikeys.json') as f:
-            api_key = json.load(f)['wolfram']
-
         client = wolframalpha.Client(api_key)
 
         # Attempt calculation
@@ -33,7 +30,7 @@ class Calculator(commands.Cog):
         # Send typing b/c this can take some time
         await ctx.trigger_typing()
 
-        result = await self.bot.loop.run_in_executor(None, Calculator.sync_calc, query)
+        result = await self.bot.loop.run_in_executor(None, Calculator.sync_calc, query, self.api_key)
 
         if result is not None:
             em = discord.Embed(title=f':desktop: Calculated: {query}',
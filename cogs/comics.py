@@ -9,6 +9,9 @@ import discord
 from discord.ext import commands
 from nltk.corpus import stopwords
 
+from utils import cpu_pool
+from utils.http_client import NOT_MODIFIED, Validators
+
 
 class Comics(commands.Cog):
     """A cog which allows you to fetch random / search for XKCD comics.
@@ -35,15 +38,15 @@ class Comics(commands.Cog):
     based on the # of whole-word matches present in the keys of the blob file.
     """
     STOPWORDS = set(stopwords.words('english'))
-    with open('data/xkcd_comics.json', encoding='utf8') as f:
-        COMICS = json.load(f)
-    with open('data/xkcd_blob.json') as f:
-        BLOB = json.load(f)
     CURRENT_URL = 'https://xkcd.com/info.0.json'
 
     def __init__(self, bot):
         self.bot = bot
-        self.session = bot.aio_session
+        self.http_client = bot.http_client
+        self.COMICS = bot.get_data('xkcd_comics')
+        self.BLOB = bot.get_data('xkcd_blob')
+        # Of the newest comic as of the last update, a 304 means there's nothing new
+        self.current_validators = Validators()
 
     def process_text(self, text: str) -> str:
         """A helper method to strip common words from text.
@@ -61,9 +64,11 @@ class Comics(commands.Cog):
         stripped_set = set([re.sub('\W+', '', x) for x in text.lower().split()])
         return ' '.join(stripped_set - self.STOPWORDS)
 
-    def get_best_match(self, query: str) -> Union[Tuple[int, str], None]:
+    async def get_best_match(self, query: str) -> Union[Tuple[int, str], None]:
         """A helper method to retrieve a comic most similar to given input.
 
+        The matching runs in the bot's process pool, see :func:`utils.cpu_pool.best_comic`.
+
         Parameters
         ----------
         query : str
@@ -75,21 +80,8 @@ class Comics(commands.Cog):
            (number_of_matches, str id of comic)
            Returns None if there were no hits whatsoever.
         """
-        match_list = []
-        input_set = set(query.lower().split())
-        for key in self.BLOB:
-            # Union of the two sets to determine # of whole word matches.
-            strength = len(set(key.split()) & input_set)
-            match_list.append((strength, self.BLOB[key]))
-
-        # Sort the match list based on # of matches and select the first result.
-        match_list.sort(key=lambda x: x[0], reverse=True)
-        best_match = match_list[0]
-        if best_match[0] == 0:
-            # If None, comic_to_embed will select a random comic
-            return None
-
-        return best_match
+        # If None, comic_to_embed will select a random comic
+        return await self.bot.cpu_pool.run(cpu_pool.best_comic, query)
 
     def comic_to_embed(self, id_tup: Union[Tuple, None]) -> discord.Embed:
         """A helper method to convert an xkcd comic to an embed.
@@ -148,7 +140,7 @@ class Comics(commands.Cog):
     @xkcd.command(aliases=['s'])
     async def search(self, ctx, *, query):
         """Search for an xkcd comic with keywords"""
-        best_match = self.get_best_match(query)
+        best_match = await self.get_best_match(query)
         comic = self.comic_to_embed(best_match)
         await ctx.send(embed=comic)
 
@@ -157,8 +149,12 @@ class Comics(commands.Cog):
     async def _update(self, ctx):
         """Update the xkcd file"""
         # Get the most recent comic
-        async with self.session.get(self.CURRENT_URL) as r:
-            current_comic = await r.json()
+        current_comic = await self.http_client.get_json(self.CURRENT_URL, validators=self.current_validators)
+        if current_comic is None:
+            return await ctx.error('Couldn\'t reach xkcd, try again later.')
+        # Nothing's changed since the last update
+        if current_comic is NOT_MODIFIED:
+            return await ctx.error('Comics already up-to-date boss!')
 
         most_recent_in_file = max([int(x) for x in self.COMICS])
         # If comics are already updated
@@ -169,8 +165,11 @@ class Comics(commands.Cog):
         comics_to_update = list(range(most_recent_in_file + 1, current_comic['num'] + 1))
         url = 'http://xkcd.com/{}/info.0.json'
         for num_comic in comics_to_update:
-            async with self.session.get(url.format(num_comic)) as r:
-                self.COMICS[str(num_comic)] = await r.json()
+            comic = await self.http_client.get_json(url.format(num_comic))
+            # Some numbers (famously 404) don't exist
+            if comic is None:
+                continue
+            self.COMICS[str(num_comic)] = comic
 
             self.BLOB[self.process_text(f"{self.COMICS[str(num_comic)]['safe_title']} \
                                         {self.COMICS[str(num_comic)]['alt']}")] = str(num_comic)
@@ -183,6 +182,9 @@ class Comics(commands.Cog):
         with open('data/xkcd_blob.json', 'w', encoding='utf8') as f:
             json.dump(self.BLOB, f)
 
+        # The pool's workers search their own copy of the blob
+        self.bot.cpu_pool.reload()
+
         await ctx.success(f'Updated {len(comics_to_update)} comic(s)!')
 
 
@@ -1,8 +1,8 @@
 import datetime
-import json
 import discord
 from discord.ext import commands
-from utils import aiohttp_wrap as aw
+
+from utils.cache import cached, fields
 
 
 class Crypto(commands.Cog):
@@ -12,21 +12,22 @@ class Crypto(commands.Cog):
     
     def __init__(self, bot):
         self.bot = bot
-        self.session = bot.aio_session
-        self.redis = bot.redis_client
+        self.http_client = bot.http_client
+
+    # Cached for 5 minutes
+    @cached('btc', ttl=5 * 60, project=fields('price_usd', 'last_updated', 'percent_change_1h',
+                                              'percent_change_24h', 'percent_change_7d'))
+    async def fetch_btc(self):
+        resp = await self.http_client.get_json(self.URL_BTC)
+        return resp[0] if resp else None
 
     @commands.command(aliases=['btc', 'buttcoin'])
     async def bitcoin(self, ctx):
         """ Get current information regarding the value of bitcoin """
 
-        # Check the cache for this information
-        if await self.redis.exists('btc'):
-            resp = json.loads(await self.redis.get('btc'))
-
-        # If not found, cache for 5 minutes
-        else:
-            resp = (await aw.aio_get_json(self.session, self.URL_BTC))[0]
-            await self.redis.set('btc', json.dumps(resp), ex=5*60)
+        resp = await self.fetch_btc()
+        if resp is None:
+            return await ctx.error('Sorry, I couldn\'t get the price of bitcoin right now.')
 
         # Create a neat embed with the information
         em = discord.Embed(color=0xF7931A)
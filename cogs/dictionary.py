@@ -1,5 +1,3 @@
-import json
-
 import discord
 from asyncurban import UrbanDictionary, WordNotFoundError
 from discord.ext import commands
@@ -9,21 +7,16 @@ from wordnik import *
 class Dictionary(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.urban = UrbanDictionary(loop=bot.loop, session=bot.aio_session)
-
-    # Load API key
-    with open('data/apikeys.json') as f:
-        apiKeys = json.load(f)
+        self.urban = UrbanDictionary(loop=bot.loop, session=bot.http_client.session)
 
-    # Init wordnik objects
-    wordnikKey = apiKeys['wordnik']
-    WordClient = swagger.ApiClient(wordnikKey, 'http://api.wordnik.com/v4')
+        # Init wordnik objects
+        self.WordClient = swagger.ApiClient(bot.api_keys['wordnik'], 'http://api.wordnik.com/v4')
 
     # Returns the most common definition of a word
     @commands.command(name='define', aliases=['d'])
     async def wordnik_define(self, ctx, *, word):
         """ Provides the definition of a word """
-        wordApi = WordApi.WordApi(Dictionary.WordClient)
+        wordApi = WordApi.WordApi(self.WordClient)
 
         parts_of_speech = {'noun': 'n.', 'verb': 'v.', 'adjective': 'adj.', 'adverb': 'adv.',
                            'interjection': 'interj.', 'conjunction': 'conj.', 'preposition': 'prep.',
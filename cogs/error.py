@@ -3,6 +3,10 @@ import traceback
 
 from discord.ext import commands
 
+from utils.circuit_breaker import UpstreamUnavailable
+from utils.deadline import DeadlineExceeded
+from utils.ratelimit import RateLimited
+
 
 class ErrorHandler(commands.Cog):
     def __init__(self, bot):
@@ -30,6 +34,21 @@ class ErrorHandler(commands.Cog):
                                    description='Sorry you need permissions '
                                                f'`{",".join(error.missing_perms)}` to do that.')
 
+        if isinstance(getattr(error, 'original', None), UpstreamUnavailable):
+            return await ctx.error('Error',
+                                   description=f'`{error.original.host}` is having problems right now. '
+                                               f'Please retry in `{error.original.retry_after:.0f}` second(s).')
+
+        if isinstance(getattr(error, 'original', None), RateLimited):
+            return await ctx.error('Busy',
+                                   description=f'Too many `{error.original.name}` requests right now. '
+                                               f'Please retry in `{error.original.retry_after:.0f}` second(s).')
+
+        if isinstance(getattr(error, 'original', None), DeadlineExceeded):
+            return await ctx.error('Error',
+                                   description=f'That took too long (waiting on `{error.original.what}`). '
+                                               'Please try again in a bit.')
+
         if isinstance(error, commands.BotMissingPermissions):
             return await ctx.error('Error',
                                    description='Sorry I need permissions '
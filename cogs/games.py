@@ -1,21 +1,17 @@
 import discord 
-import json
 from discord.ext import commands
 from datetime import datetime 
 
-from utils import aiohttp_wrap as aw 
-
 
 class Game(commands.Cog):
     """ Cog which allows fetching of video game information """
     IG_URL = 'https://api-2445582011268.apicast.io/{}/'
     IG_ICON_URL = 'https://www.igdb.com/favicon-196x196.png'
-    with open('data/apikeys.json') as f:
-        KEY = json.load(f)['igdb']
 
     def __init__(self, bot):
         self.bot = bot
-        self.session = bot.aio_session
+        self.KEY = bot.api_keys['igdb']
+        self.http_client = bot.http_client
     
     @commands.command(aliases=['games'])
     async def game(self, ctx, *, query: str):
@@ -25,7 +21,7 @@ class Game(commands.Cog):
         params = {'search': query, 
                   'fields': 'name,url,summary,first_release_date,total_rating,cover'}
         
-        resp = (await aw.aio_get_json(self.session, url, headers=headers, params=params))[0]
+        resp = (await self.http_client.get_json(url, headers=headers, params=params))[0]
 
         # Create embed
         em = discord.Embed(timestamp=datetime.fromtimestamp(resp['first_release_date']//1000), 
@@ -6,13 +6,13 @@ from discord.ext import commands
 class Giphy(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.aio_session = bot.aio_session
+        self.http_client = bot.http_client
 
 
     @commands.command(name='gif', aliases=['jif', 'jiff'])
     async def giphy(self, ctx, *, query=None):
         """ returns a random gif matching a query """
-        gif_result = await gwrap.rand_search(self.aio_session, query=query)
+        gif_result = await gwrap.rand_search(self.http_client, query=query)
 
         if gif_result:
             await ctx.send(gif_result['url'])
@@ -23,7 +23,7 @@ class Giphy(commands.Cog):
     @commands.cooldown(rate=1, per=60.0, type=commands.BucketType.user)
     async def thanks(self, ctx):
         """ Thank your overlord, qtbot """
-        gif_result = await gwrap.rand_search(self.aio_session, query='blushing')
+        gif_result = await gwrap.rand_search(self.http_client, query='blushing')
 
         em = discord.Embed()
         em.set_image(url=gif_result['fixed_width_downsampled_url'])
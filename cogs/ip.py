@@ -1,21 +1,32 @@
 import discord
 from discord.ext import commands
-from utils import aiohttp_wrap as aw
 import time
 
+from utils.cache import NOT_FOUND, cached, fields
+
 class IPLookup(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.aio_session = bot.aio_session
+        self.http_client = bot.http_client
         self.api_uri = 'http://ip-api.com/json/{}'
 
+    # Lookups for a day, failed lookups for an hour
+    @cached('ip', ttl=24 * 60 * 60, negative_ttl=60 * 60,
+            project=fields('org', 'city', 'regionName', 'country', 'lat', 'lon', 'as'))
+    async def lookup(self, query: str):
+        res = await self.http_client.get_json(self.api_uri.format(query))
+        if res is None:
+            return None
+
+        return NOT_FOUND if res['status'] == 'fail' else res
+
     @commands.command(aliases=['ip'])
     async def iplookup(self, ctx, *, query: str):
         """ Get information about an IP or website """
-        res = await aw.aio_get_json(self.aio_session, self.api_uri.format(query))
+        res = await self.lookup(query)
 
         # Check whether successful
-        if not res or res['status'] == 'fail':
+        if not res:
             return await ctx.send(f"Sorry, I couldn't find any data on `{query}`.")
 
         em = discord.Embed(title=res['org'], color=discord.Color.dark_magenta())
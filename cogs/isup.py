@@ -1,45 +1,40 @@
 import discord
-from utils import aiohttp_wrap as aw
-from bs4 import BeautifulSoup
 from discord.ext import commands
 
+from utils.cache import cached
+from utils.html_stream import Target
+
 
 class DownDetect(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.uri = 'http://downforeveryoneorjustme.com/{}'
-        self.aio_session = bot.aio_session
-        self.redis_client = bot.redis_client
+        self.http_client = bot.http_client
+
+    # Results are good for 5 minutes
+    @cached('isup', ttl=300)
+    async def is_up(self, check_url: str):
+        """ True / False for up / down, None if the checker itself couldn't be reached """
+        # Only the text directly inside the first <p> -- the site's url is in a child tag, so a
+        # website with 'not' in the url is not erroneously detected. Nothing after it is downloaded.
+        found = await self.http_client.extract(self.uri.format(check_url), {'result': Target('p', own_text=True)})
+        if found is None:
+            return None
+
+        return 'not' not in (found['result'] or '')
 
     @commands.command(name='isup', aliases=['dd'])
     @commands.cooldown(rate=1, per=2.0, type=commands.BucketType.user)
     async def down_detector(self, ctx, check_url):
         """ Check whether a website is down or up """
+        is_up = await self.is_up(check_url)
 
-        # Recent result found in cache (< 5 minutes)
-        if await self.redis_client.exists(f'isup:{check_url}'):
-            if await self.redis_client.get(f'isup:{check_url}'):
-                return await ctx.send(f'`{check_url}` Looks up from here.')
-            else:
-                return await ctx.send(f'`{check_url}` Looks down from here.')
-
-        # Recent result not cached
+        if is_up is None:
+            await ctx.error("Sorry, I couldn't check that right now.")
+        elif is_up:
+            await ctx.send(f'`{check_url}` Looks up from here.')
         else:
-            request_html = await aw.aio_get_text(self.aio_session, self.uri.format(check_url))
-
-            # Get soupy
-            soup = BeautifulSoup(request_html, 'html.parser')
-
-            # Ugly but ensures that a website with 'not' in the url
-            # Is not erroneously detected
-            isup_result = str(soup.find('p')).split('>')[1].strip().split('<')[0]
-
-            if 'not' in isup_result:
-                await ctx.send(f'`{check_url}` Looks down from here.')
-                await self.redis_client.set(f'isup:{check_url}', False, ex=300)
-            else:
-                await ctx.send(f'`{check_url}` Looks up from here.')
-                await self.redis_client.set(f'isup:{check_url}', True, ex=300)
+            await ctx.send(f'`{check_url}` Looks down from here.')
 
 
 def setup(bot):
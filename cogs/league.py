@@ -1,4 +1,3 @@
-import ast
 import asyncio
 import json
 import textwrap
@@ -6,15 +5,26 @@ from functools import partial
 
 import discord
 import lolrune
-from bs4 import BeautifulSoup
 from discord.ext import commands
 from riotwatcher import RiotWatcher
 
-from utils import aiohttp_wrap as aw
 from utils import league as lu
+from utils.cache import NOT_FOUND, cached, fields
+from utils.html_stream import Target
+from utils.http_client import NOT_MODIFIED
 from utils.user_funcs import PGDB
 
 
+def project_elo(elo_data: dict) -> dict:
+    """ Only what get_league_elo shows, with a 'None' error margin as 0 because "+/- None" looks bad """
+    projected = {kind: fields('avg', 'err', 'summary')(elo_data[kind]) for kind in ('ranked', 'normal', 'ARAM')}
+    for kind_data in projected.values():
+        if kind_data.get('err') is None:
+            kind_data['err'] = 0
+
+    return projected
+
+
 class League(commands.Cog):
     """
     This thing is HUGE and I should probably chop it into little bits at some point.
@@ -25,14 +35,12 @@ class League(commands.Cog):
     def __init__(self, bot):
         # Bot attrs
         self.bot = bot
-        self.session = bot.aio_session
-        self.redis_client = bot.redis_client
+        self.http_client = bot.http_client
         self.db = PGDB(bot.pg_con)
         # self.rune_client = bot.rune_client
 
         # Champion data
-        with open('data/champ_data.json') as f:
-            self.champ_data = json.load(f)
+        self.champ_data = bot.get_data('champ_data')
 
         # Request information
         self.elo_api_uri = 'https://na.whatismymmr.com/api/v1/summoner?name={}'
@@ -42,11 +50,8 @@ class League(commands.Cog):
         self.patch_url = 'https://na.leagueoflegends.com/en/news/game-updates/patch'
 
         # API deets
-        with open('data/apikeys.json') as fp:
-            api_keys = json.load(fp)
-
-        self.champion_gg_api_key = api_keys['champion.gg']
-        self.riot_api_key = api_keys['riot']
+        self.champion_gg_api_key = bot.api_keys['champion.gg']
+        self.riot_api_key = bot.api_keys['riot']
         self.riot_watcher = RiotWatcher(self.riot_api_key)
 
     @commands.command(name='aln', aliases=['addl'])
@@ -78,10 +83,17 @@ class League(commands.Cog):
 
         return em
 
+    # Stored for 6hrs (API only updates twice a day anyway), then refreshed in the background for a day
+    @cached('champ_info', ttl=60 * 60 * 6, stale_ttl=60 * 60 * 24,
+            project=lambda res: [fields('role', 'percentRolePlayed', 'playRate', 'winRate', 'banRate')(x)
+                                 for x in res])
+    async def fetch_champ_info(self, champ_id):
+        uri = 'http://api.champion.gg/v2/champions/{}?api_key={}'
+        return await self.http_client.get_json(uri.format(champ_id, self.champion_gg_api_key)) or None
+
     @commands.command(name='ci', aliases=['champ'])
     async def get_champ_info(self, ctx, *, champ):
         """ Return play, ban, and win rate for a champ """
-        uri = 'http://api.champion.gg/v2/champions/{}?api_key={}'
         if champ.lower() == 'wukong':
             champ = 'MonkeyKing'
 
@@ -91,20 +103,11 @@ class League(commands.Cog):
         champ_title = lu.get_champ_title(self.champ_data, riot_champ_name)
         champ_id = lu.get_champ_id(self.champ_data, riot_champ_name)
 
-        # Check for cached results
-        if await self.redis_client.exists(f'champ_info:{champ_id}'):
-            res_string = await self.redis_client.get(f'champ_info:{champ_id}')
-            res = json.loads(res_string)
-
-        # Stores results if not found in cache for 6hrs (API only updates twice a day anyway)
-        else:
-            res = await aw.aio_get_json(self.session, uri.format(champ_id, self.champion_gg_api_key))
+        res = await self.fetch_champ_info(champ_id)
 
-            # New champs have no data
-            if not res:
-                return await ctx.send('Sorry, no data for `{}`, yet.'.format(fancy_champ_name))
-
-            await self.redis_client.set(f'champ_info:{champ_id}', json.dumps(res), ex=60 * 60 * 6)
+        # New champs have no data
+        if not res:
+            return await ctx.send('Sorry, no data for `{}`, yet.'.format(fancy_champ_name))
 
         # Decide whether we actually need pagination here
         if len(res) > 1:
@@ -140,16 +143,27 @@ class League(commands.Cog):
     @commands.is_owner()
     async def update_champ_file(self, ctx):
         """ Creates / updates a json file containing champion IDs, names, titles, etc. """
+        await self.bot.ratelimiter.acquire('riot')
         func = partial(self.riot_watcher.static_data.champions, 'na1')
         champ_data = await self.bot.loop.run_in_executor(None, func)
 
         with open('data/champ_data.json', 'w') as f:
             json.dump(champ_data, f)
 
-        self.champ_data = champ_data
+        self.champ_data = self.bot.data['champ_data'] = champ_data
 
         await ctx.send('Updated champion information file.')
 
+    # Store the data for 2hrs because it doesn't update that frequently, unknown summoners for 10 minutes
+    @cached('elo', ttl=2 * 60 * 60, negative_ttl=600, project=project_elo)
+    async def fetch_elo(self, f_summoner: str):
+        elo_data = await self.http_client.get_json(self.elo_api_uri.format(f_summoner), headers=self.elo_headers)
+
+        if elo_data is None:
+            return None
+
+        return NOT_FOUND if 'error' in elo_data else elo_data
+
     @commands.command(name='elo', aliases=['mmr'])
     async def get_league_elo(self, ctx, *, summoner=''):
         """ Get League of Legends elo / mmr from na.whatismymmr.com """
@@ -168,30 +182,11 @@ class League(commands.Cog):
 
         f_summoner = summoner.replace(' ', '%20')
 
-        # Check whether there is a cached elo_dataponse
-        if await self.redis_client.exists(f'elo:{f_summoner}'):
-            raw_elo_data = await self.redis_client.get(f'elo:{f_summoner}')
-            elo_data = json.loads(raw_elo_data)
-
-        # Make the call
-        # Store the data for 2hrs because it doesn't update that frequently
-        else:
-            # Send typing because this can take a while
-            await ctx.trigger_typing()
-            elo_data = await aw.aio_get_json(
-                self.session, self.elo_api_uri.format(f_summoner), headers=self.elo_headers)
-
-            # No data found -- don't bother storing it
-            if elo_data is None or 'error' in elo_data:
-                return await ctx.send(f"Sorry, I can't find `{summoner}`\nResponse:```{elo_data}```")
-
-            # Store in redis cache
-            await self.redis_client.set(f'elo:{f_summoner}', json.dumps(elo_data), ex=2 * 60 * 60)
-
-        # Replace 'None' with 0 for error margin because "+/- None" looks bad
-        for kind in elo_data:
-            if elo_data[kind]['err'] is None:
-                elo_data[kind]['err'] = 0
+        # Send typing because this can take a while
+        await ctx.trigger_typing()
+        elo_data = await self.fetch_elo(f_summoner)
+        if elo_data is None:
+            return await ctx.send(f"Sorry, I can't find `{summoner}`.")
 
         # Create embed
         em = discord.Embed(color=discord.Color.green())
@@ -226,33 +221,46 @@ class League(commands.Cog):
     @commands.command(aliases=['patch', 'pnotes'])
     async def patch_notes(self, ctx):
         """ Get the latest League of Legends patch notes """
-        if await self.redis_client.exists('league_pnotes'):
-            em_dict = ast.literal_eval(await self.redis_client.get('league_pnotes'))
-            em = discord.Embed.from_data(em_dict)
+        em_dict = await self.fetch_patch_notes()
+        if em_dict is None:
+            return await ctx.error("Sorry, I couldn't get the patch notes right now.")
+
+        await ctx.send(embed=discord.Embed.from_dict(em_dict))
+
+    # Store this embed for 3 hours for easy retrieval later, after which the old notes are
+    # shown while the two pages are scraped again in the background
+    @cached('league_pnotes', ttl=10800, stale_ttl=60 * 60 * 24)
+    async def fetch_patch_notes(self):
+        """ Scrapes the newest patch notes into an embed dict """
+        # Initial request for the newest patch notes, only as far as its link and image
+        index = await self.http_client.extract(self.patch_url, {'link': Target('h4 a', attr='href'),
+                                                                'image': Target('img[typeof=foaf:Image]', attr='src')},
+                                               headers=self.browser_headers)
+        # NOT_MODIFIED means the newest patch is still the one we have
+        if index is None or index is NOT_MODIFIED:
+            return index
+        if index['link'] is None or index['image'] is None:
+            return None
+
+        newest_patch_url = f'https://na.leagueoflegends.com{index["link"]}'
+        image_url = f'https://na.leagueoflegends.com{index["image"]}'
+
+        # Scrape the actual patch notes page, up to the summary at the top
+        page = await self.http_client.extract(newest_patch_url, {'summary': 'blockquote'},
+                                              headers=self.browser_headers, conditional=False)
+        if page is None or page['summary'] is None:
+            return None
+
+        patch_summary = textwrap.shorten(page['summary'], width=1000, placeholder='...')
 
-        else:
-            # Initial request for the newest patch notes
-            patch_main_html = await aw.aio_get_text(self.session, self.patch_url, headers=self.browser_headers)
-            soup = BeautifulSoup(patch_main_html, 'lxml')
-            newest_patch_url = f'https://na.leagueoflegends.com{soup.find("h4").a["href"]}'
-            image_url = f"https://na.leagueoflegends.com{soup.find('img', attrs={'typeof': 'foaf:Image'})['src']}"
-
-            # Scrape the actual patch notes page
-            patch_page_html = await aw.aio_get_text(self.session, newest_patch_url, headers=self.browser_headers)
-            soup = BeautifulSoup(patch_page_html, 'lxml')
-            patch_summary = textwrap.shorten(soup.find('blockquote').text, width=1000, placeholder='...')
-
-            # Create embed
-            em = discord.Embed(color=discord.Color.green(), description=patch_summary)
-            em.set_image(url=image_url)
-            em.set_author(name='LoL Patch Notes',
-                          url=newest_patch_url,
-                          icon_url='http://2.bp.blogspot.com/-HqSOKIIV59A/U8WP4WFW28I/AAAAAAAAT5U/qTSiV9UgvUY/s1600/icon.png')
-
-            # Store this embed for 3 hours for easy retrieval later
-            await self.redis_client.set('league_pnotes', str(em.to_dict()), ex=10800)
+        # Create embed
+        em = discord.Embed(color=discord.Color.green(), description=patch_summary)
+        em.set_image(url=image_url)
+        em.set_author(name='LoL Patch Notes',
+                      url=newest_patch_url,
+                      icon_url='http://2.bp.blogspot.com/-HqSOKIIV59A/U8WP4WFW28I/AAAAAAAAT5U/qTSiV9UgvUY/s1600/icon.png')
 
-        await ctx.send(embed=em)
+        return em.to_dict()
 
     # def rune_to_embed(self, champ: lolrune.Champion, riot_name: str) -> discord.Embed:
     #     """A nice helper method which returns an embed based on Champion input."""
@@ -75,17 +75,12 @@ class Moderator(commands.Cog):
     @commands.has_permissions(manage_guild=True)
     async def set_prefix(self, ctx, *, prefix):
         """ Set the server's command prefix for qtbot """
-        execute = f'''INSERT INTO custom_prefix (guild_id, prefix) VALUES ({ctx.guild.id}, $1)
-                      ON CONFLICT (guild_id) DO 
-                          UPDATE SET prefix = $1;'''
+        # Saves the prefix and invalidates it in every other bot process
         try:
-            await self.pg.execute(execute, prefix)
+            await self.bot.guild_settings.set_prefix(ctx.guild.id, prefix)
         except Exception as e:
             print(e)
             await ctx.send(f"Sorry, couldn't change prefix to `{prefix}`.")
-        else:
-            # Update the prefix dict
-            self.bot.pre_dict[ctx.guild.id] = prefix
 
         await ctx.send(f'Changed command prefix to `{prefix}`.')
 
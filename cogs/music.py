@@ -1,8 +1,6 @@
 import discord
 from discord.ext import commands
 
-from utils import aiohttp_wrap as aw 
-
 
 class MusicInfo(commands.Cog):
     """A cog for retrieving music information (not playing it)"""
@@ -30,7 +28,7 @@ class MusicInfo(commands.Cog):
         """Search for some basic album information via album name"""
         search_params = {'method': 'album.search', 'album': query, 'limit': 5,
                          'format': 'json', 'api_key': self.TOKEN}
-        search_resp = await aw.aio_get_json(ctx.bot.aio_session, self.URL, params=search_params)
+        search_resp = await ctx.bot.http_client.get_json(self.URL, params=search_params)
 
         # API didn't respond
         if search_resp is None:
@@ -47,7 +45,7 @@ class MusicInfo(commands.Cog):
         # Once we've found the matching album, we've gotta do ANOTHER request
         info_params = {'method': 'album.getInfo', 'artist': artist, 'album': name, 
                        'format': 'json', 'api_key': self.TOKEN}
-        info_resp = await aw.aio_get_json(ctx.bot.aio_session, self.URL, params=info_params)
+        info_resp = await ctx.bot.http_client.get_json(self.URL, params=info_params)
 
         em = discord.Embed(title=f'{artist} - {name}',
                            url=info_resp['album']['url'],
@@ -1,20 +1,19 @@
-import json
 import asyncio
 import re
 import discord
 from datetime import datetime
-from utils import aiohttp_wrap as aw
 from discord.ext import commands
 
+from utils.cache import cached, fields
+from utils.http_client import NOT_MODIFIED
+
 
 class News(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.redis_client = bot.redis_client
-        self.aio_session = bot.aio_session
+        self.http_client = bot.http_client
         self.uri = 'https://newsapi.org/v1/articles?source=google-news&sortBy=top&apiKey={}'
-        with open('data/apikeys.json') as f:
-            self.api_key = json.load(f)['news']
+        self.api_key = bot.api_keys['news']
 
 
     @staticmethod
@@ -47,6 +46,17 @@ class News(commands.Cog):
 
         return em
 
+    # Only as many articles as there are page reactions, and only what json_to_embed uses
+    @cached('news', ttl=300, stale_ttl=60 * 60,
+            project=lambda articles: [fields('title', 'description', 'url', 'urlToImage', 'publishedAt')(x)
+                                      for x in articles[:9]])
+    async def fetch_articles(self):
+        api_response = await self.http_client.get_json(self.uri.format(self.api_key))
+        if api_response is None or api_response is NOT_MODIFIED:
+            return api_response
+
+        return api_response['articles']
+
     @commands.command(name='news')
     async def get_news(self, ctx):
         """ Get the top 5 articles from Google News (http://newsapi.org) (Paginated) """
@@ -56,21 +66,12 @@ class News(commands.Cog):
 
         em_dict = {}
 
-        if await self.redis_client.exists('news'):
-            raw_json_string = await self.redis_client.get('news')
-            raw_json_dict = json.loads(raw_json_string)
-            article_list = raw_json_dict['articles']
-
-            for idx, article in enumerate(article_list[:9]):
-                em_dict[emoji_tup[idx]] = self.json_to_embed(article)
-
-        else:
-            api_response = await aw.aio_get_json(self.aio_session, self.uri.format(self.api_key))
-            article_list = api_response['articles']
-            await self.redis_client.set('news', json.dumps(api_response), ex=300)
+        article_list = await self.fetch_articles()
+        if not article_list:
+            return await ctx.error('Sorry, I couldn\'t get the news right now.')
 
-            for idx, article in enumerate(article_list[:9]):
-                em_dict[emoji_tup[idx]] = self.json_to_embed(article)
+        for idx, article in enumerate(article_list[:9]):
+            em_dict[emoji_tup[idx]] = self.json_to_embed(article)
 
         bot_message = await ctx.send(embed=em_dict[emoji_tup[0]])
 
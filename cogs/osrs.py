@@ -5,21 +5,30 @@ from typing import Union
 import discord
 from discord.ext import commands
 
-from utils import aiohttp_wrap as aw
+from utils import cpu_pool
 from utils import dict_manip as dm
+from utils.cache import cached, fields
+from utils.http_client import NOT_MODIFIED, Validators
 from utils.user_funcs import PGDB
 
 
+def project_prices(item_prices: dict) -> dict:
+    """ Only the four numbers ge_search shows, out of ~10 fields for every item """
+    price_fields = fields('buy_average', 'sell_average', 'buy_quantity', 'sell_quantity')
+    return {item_id: price_fields(prices) for item_id, prices in item_prices.items()}
+
+
 class OSRS(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db = PGDB(bot.pg_con)
-        self.aio_session = bot.aio_session
-        self.redis_client = bot.redis_client
+        self.http_client = bot.http_client
 
         self.items_uri = 'https://rsbuddy.com/exchange/names.json'
         # self.api_uri = 'https://api.rsbuddy.com/grandExchange?a=guidePrice&i={}'
         self.prices_uri = 'https://storage.googleapis.com/osbuddy-exchange/summary.json'
+        # Of the last item list this process updated from, a 304 means there's nothing new
+        self.items_validators = Validators()
 
         self.player_uri = 'http://services.runescape.com/m=hiscore_oldschool/index_lite.ws?player={}'
         self.player_click_uri = 'http://services.runescape.com/m=hiscore_oldschool/hiscorepersonal.ws?user1={}'
@@ -41,8 +50,12 @@ class OSRS(commands.Cog):
         self.user_not_exist = "Couldn't find a user matching {}"
         self.color = discord.Color.dark_gold()
 
-        with open('data/item-data.json') as f:
-            self.item_data = json.load(f)
+        self.item_data = bot.get_data('item_data')
+
+    # Prices barely move in an hour, so an old copy is served while a new one is fetched
+    @cached('osrs_prices', ttl=5 * 60, stale_ttl=60 * 60, project=project_prices)
+    async def fetch_prices(self):
+        return await self.http_client.get_json(self.prices_uri)
 
     @commands.group(name='ge', invoke_without_command=True)
     async def ge_search(self, ctx, *, query):
@@ -56,18 +69,12 @@ class OSRS(commands.Cog):
             item_id = self.item_data[item]['id']
         # Uses closest match to said item if no exact match
         else:
-            item = dm.get_closest(self.item_data, item)
+            item = await self.bot.cpu_pool.run(cpu_pool.closest_item, item)
             item_id = self.item_data[item]['id']
 
-        if await self.redis_client.exists('osrs_prices'):
-            item_prices = json.loads((await self.redis_client.get('osrs_prices')))
-        else:
-            item_prices = await aw.aio_get_json(self.aio_session, self.prices_uri)
-
-            if not item_prices:
-                return await ctx.error('The RSBuddy API is dead yet again. Try again in a bit.')
-
-            await self.redis_client.set('osrs_prices', json.dumps(item_prices), ex=(5*60))
+        item_prices = await self.fetch_prices()
+        if not item_prices:
+            return await ctx.error('The RSBuddy API is dead yet again. Try again in a bit.')
 
         # Create pretty embed
         em = discord.Embed(title=item.capitalize(), color=self.color)
@@ -84,7 +91,9 @@ class OSRS(commands.Cog):
     @commands.is_owner()
     async def _update(self, ctx):
         """A command to update the OSRS GE item list"""
-        new_items = await aw.aio_get_json(self.aio_session, self.items_uri)
+        new_items = await self.http_client.get_json(self.items_uri, validators=self.items_validators)
+        if new_items is NOT_MODIFIED:
+            return await ctx.error('Items already up-to-date boss!')
         
         # This 503's a lot, if not every time, not sure yet
         if new_items is None:
@@ -106,7 +115,9 @@ class OSRS(commands.Cog):
         with open('data/item-data.json', 'w') as f:
             json.dump(filtered_items, f, indent=2)
 
-        self.item_data = filtered_items
+        self.item_data = self.bot.data['item_data'] = filtered_items
+        # The pool's workers match against their own copy of the item names
+        self.bot.cpu_pool.reload()
         
         num_updated = len(new_items) - len(self.item_data)
         await ctx.success(f'Updated `{num_updated}` item(s).')
@@ -149,7 +160,7 @@ class OSRS(commands.Cog):
     async def get_user_info(self, username: str) -> Union[dict, None]:
         """Helper method to see whether a user exists, if so, retrieves the data and formats it in a dict
         returns None otherwise"""
-        user_info = await aw.aio_get_text(self.aio_session, self.player_uri.format(quote_plus(username)))
+        user_info = await self.http_client.get_text(self.player_uri.format(quote_plus(username)))
         if user_info is None:
             return None
 
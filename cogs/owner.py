@@ -38,16 +38,13 @@ class Owner(commands.Cog):
     @commands.is_owner()
     async def reload_all(self, ctx):
         """ Reloads all extensions """
-        # Gets cog list and removes admin cog (can't reload without it)
-        ext_list = []
-        for extension in self.bot.startup_extensions:
-            ext_list.append(f'cogs.{extension}')
-        ext_list.remove(ext_list.index('cogs.owner'))
+        # Gets loaded cog list (lazy mode may not have everything) and removes admin cog (can't reload without it)
+        ext_list = [x for x in self.bot.extensions if x != 'cogs.owner']
 
         # Reloads all cogs
         for extension in ext_list:
             self.bot.reload_extension(extension)
-        await ctx.success(f'Reloaded `{len(self.bot.startup_extensions)}` extensions.')
+        await ctx.success(f'Reloaded `{len(ext_list)}` extensions.')
 
 
 def setup(bot):
@@ -0,0 +1,234 @@
+import copy
+from datetime import datetime
+
+import discord
+from discord.ext import commands
+
+from utils import memory
+from utils import profiling
+
+
+class Perf(commands.Cog):
+    """Owner-only tools for finding out where the bot spends its time."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.color = discord.Color.dark_teal()
+        # Stored by `memory snapshot`, compared against by `memory diff`
+        self.mem_snapshot = None
+
+    @staticmethod
+    def latency_table(rows: list) -> str:
+        """ Formats [(name, histogram)] as a p50 / p95 / p99 table (in ms) """
+        width = max([len(name) for name, _ in rows] + [4])
+        lines = [f'{"name":<{width}} {"p50":>8} {"p95":>8} {"p99":>8} {"count":>7}']
+        for name, hist in rows:
+            p50, p95, p99 = (hist.quantile(q) * 1000 for q in (0.5, 0.95, 0.99))
+            lines.append(f'{name:<{width}} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {hist.count:>7}')
+
+        return '\n'.join(lines)
+
+    @commands.group(invoke_without_command=True, hidden=True)
+    @commands.is_owner()
+    async def perf(self, ctx, limit: int = 10):
+        """ List the slowest commands by p95 latency """
+        rows = self.bot.metrics.slowest('command', limit=limit)
+        if not rows:
+            return await ctx.error('No commands have been timed yet.')
+
+        em = discord.Embed(title=':stopwatch: Slowest commands (ms)', color=self.color,
+                           description=f'```\n{self.latency_table(rows)}```')
+        await ctx.send(embed=em)
+
+    @perf.command(name='upstream', aliases=['up'])
+    @commands.is_owner()
+    async def perf_upstream(self, ctx, kind: str = 'http', limit: int = 10):
+        """ List the slowest upstreams of a kind (http, postgres, redis) by p95 latency """
+        rows = self.bot.metrics.slowest(kind.lower(), limit=limit)
+        if not rows:
+            return await ctx.error(f'Nothing of kind `{kind}` has been timed yet.')
+
+        em = discord.Embed(title=f':stopwatch: Slowest {kind} calls (ms)', color=self.color,
+                           description=f'```\n{self.latency_table(rows)}```')
+        await ctx.send(embed=em)
+
+    @commands.group(invoke_without_command=True, hidden=True)
+    @commands.is_owner()
+    async def trace(self, ctx):
+        """ List the most recently traced commands """
+        recent = list(self.bot.tracer.finished)[-10:]
+        if not recent:
+            return await ctx.error('No commands have been traced yet.')
+
+        lines = '\n'.join(f'{x.command:<24} {x.root.duration * 1000:>8.1f}ms {x.num_spans:>4} spans'
+                          for x in reversed(recent))
+        em = discord.Embed(title=':mag: Recent traces', color=self.color, description=f'```\n{lines}```')
+        await ctx.send(embed=em)
+
+    @trace.command(name='last')
+    @commands.is_owner()
+    async def trace_last(self, ctx, *, command: str = None):
+        """ Show a waterfall of the most recent trace of a command """
+        if command is not None:
+            # Aliases resolve to the name traces are stored under
+            found = self.bot.get_command(command)
+            command = found.qualified_name if found else command
+
+        trace = self.bot.tracer.last(command)
+        if trace is None:
+            return await ctx.error(f'No trace found for `{command}`.')
+
+        waterfall = trace.render()
+        if len(waterfall) > 1900:
+            waterfall = f'{waterfall[:1900]}\n...'
+
+        await ctx.send(f'```\n{waterfall}```')
+
+    @commands.group(invoke_without_command=True, hidden=True)
+    @commands.is_owner()
+    async def lag(self, ctx):
+        """ Show event loop lag and the code that blocked it most often """
+        watchdog = self.bot.watchdog
+        em = discord.Embed(title=':turtle: Event loop lag', color=self.color)
+        em.add_field(name='Last', value=f'{watchdog.last_lag * 1000:.1f}ms')
+        em.add_field(name='p95', value=f'{watchdog.histogram.quantile(0.95) * 1000:.1f}ms')
+        em.add_field(name='Max', value=f'{watchdog.max_lag * 1000:.1f}ms')
+        em.add_field(name=f'Stalls (> {watchdog.threshold * 1000:.0f}ms)', value=str(sum(watchdog.hotspots.values())))
+
+        hotspots = '\n'.join(f'{n:>4}x {spot}' for spot, n in watchdog.hotspots.most_common(8))
+        em.add_field(name='Blocking hot spots', value=f'```\n{hotspots[-1000:]}```' if hotspots else 'None yet',
+                     inline=False)
+        em.set_footer(text=f'Use {ctx.prefix}lag stall <n> to see a recent stall\'s stack (1 = newest)')
+        await ctx.send(embed=em)
+
+    @lag.command(name='stall')
+    @commands.is_owner()
+    async def lag_stall(self, ctx, number: int = 1):
+        """ Show the stack captured during a recent stall """
+        stalls = self.bot.watchdog.stalls
+        if not 0 < number <= len(stalls):
+            return await ctx.error(f'There are only {len(stalls)} recorded stall(s).')
+
+        stall = stalls[-number]
+        when = datetime.fromtimestamp(stall.when).strftime('%H:%M:%S')
+        await ctx.send(f'**{stall.lag * 1000:.0f}ms** at {when}\n```py\n{stall.format()[-1800:]}```')
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def profile(self, ctx, *, command_string: str):
+        """ Run a command here with profiling enabled and reply with the top hotspots
+
+        e.g. `profile weather 10001` for cProfile, or `profile --sample weather 10001`
+        for the low-overhead sampling profiler """
+        mode = 'cprofile'
+        if command_string.startswith('--sample'):
+            mode = 'sample'
+            command_string = command_string[len('--sample'):].strip()
+
+        # Re-run the message as if the author had sent the command itself
+        msg = copy.copy(ctx.message)
+        msg.content = f'{ctx.prefix}{command_string}'
+        new_ctx = await self.bot.get_context(msg, cls=type(ctx))
+        if new_ctx.command is None and new_ctx.invoked_with and self.bot.load_lazy_extension(new_ctx.invoked_with):
+            new_ctx = await self.bot.get_context(msg, cls=type(ctx))
+
+        if new_ctx.command is None:
+            return await ctx.error(f'No command called `{new_ctx.invoked_with}` found.')
+
+        with profiling.profile(mode) as prof:
+            await self.bot.invoke(new_ctx)
+
+        report = prof.report()
+        if len(report) > 1800:
+            report = report[:1800]
+
+        await ctx.send(f'**{mode}** `{command_string}` took {prof.elapsed * 1000:.1f}ms\n```\n{report}```')
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def workers(self, ctx):
+        """ Show the load of each cog worker process """
+        if self.bot.remote_cogs is None:
+            return await ctx.error('No cogs are running in worker processes.')
+
+        lines = [f'{"worker":<6} {"pid":>7} {"inflight":>8} {"active":>6} {"handled":>7} {"errors":>6} {"lag ms":>7}']
+        for worker, report in await self.bot.remote_cogs.load():
+            if report is None:
+                lines.append(f'{worker.worker_id:<6} {"down":>7} {len(worker.inflight):>8}')
+                continue
+
+            lines.append(f'{worker.worker_id:<6} {report["pid"]:>7} {len(worker.inflight):>8} {report["active"]:>6} '
+                         f'{report["handled"]:>7} {report["errors"]:>6} {report["lag"] * 1000:>7.1f}')
+
+        em = discord.Embed(title=':factory: Cog workers', color=self.color,
+                           description='```\n{}```'.format('\n'.join(lines)))
+        em.set_footer(text=f'Running {", ".join(sorted(self.bot.remote_cogs.cogs))}')
+        await ctx.send(embed=em)
+
+    # Not `mem` -- that's already an alias of the meme command
+    @commands.group(name='memory', invoke_without_command=True, hidden=True)
+    @commands.is_owner()
+    async def _memory(self, ctx, *, cog: str = None):
+        """ Show the memory retained by each loaded cog, or by one cog's attributes """
+        snap = memory.MemorySnapshot(self.bot)
+        budgets = self.bot.api_keys.get('memory_budgets', {})
+
+        if cog is not None:
+            if cog not in snap.usage:
+                return await ctx.error(f'No loaded cog called `{cog}`.')
+
+            attrs = sorted(snap.usage[cog].items(), key=lambda x: x[1], reverse=True)
+            lines = '\n'.join(f'{memory.fmt_bytes(size):>9}  {attr}' for attr, size in attrs[:20])
+            em = discord.Embed(title=f':floppy_disk: {cog} ({memory.fmt_bytes(snap.total(cog))})',
+                               color=self.color, description=f'```\n{lines}```')
+            return await ctx.send(embed=em)
+
+        lines = []
+        for name in sorted(snap.usage, key=snap.total, reverse=True):
+            total = snap.total(name)
+            traced = f' {memory.fmt_bytes(snap.traced[name]):>9}' if snap.traced is not None else ''
+            over = ' !' if name in budgets and total > budgets[name] * 1024 * 1024 else ''
+            lines.append(f'{name:<16} {memory.fmt_bytes(total):>9}{traced}{over}')
+
+        header = f'{"cog":<16} {"data":>9}' + (f' {"traced":>9}' if snap.traced is not None else '')
+        em = discord.Embed(title=':floppy_disk: Memory by cog', color=self.color,
+                           description='```\n{}\n{}```'.format(header, '\n'.join(lines)))
+        if snap.traced is None:
+            em.set_footer(text='Run the bot with --trace-memory to see what each cog allocated (tracemalloc)')
+        else:
+            em.set_footer(text='! = over its memory budget')
+        await ctx.send(embed=em)
+
+    @_memory.command(name='snapshot')
+    @commands.is_owner()
+    async def memory_snapshot(self, ctx):
+        """ Store the current per-cog memory usage for a later `memory diff` """
+        self.mem_snapshot = memory.MemorySnapshot(self.bot)
+        await ctx.success('Stored a memory snapshot.')
+
+    @_memory.command(name='diff')
+    @commands.is_owner()
+    async def memory_diff(self, ctx):
+        """ Compare per-cog memory usage with the stored snapshot (e.g. before / after a reload) """
+        before = self.mem_snapshot
+        if before is None:
+            return await ctx.error('No snapshot stored yet, use `memory snapshot` first.')
+
+        after = memory.MemorySnapshot(self.bot)
+        lines = []
+        for name in sorted(set(before.usage) | set(after.usage)):
+            delta = after.total(name) - before.total(name)
+            line = f'{name:<16} {memory.fmt_bytes(before.total(name)):>9} -> {memory.fmt_bytes(after.total(name)):>9} ' \
+                   f'({"+" if delta >= 0 else "-"}{memory.fmt_bytes(abs(delta))})'
+            if before.traced is not None and after.traced is not None:
+                traced_delta = after.traced.get(name, 0) - before.traced.get(name, 0)
+                line += f' traced {"+" if traced_delta >= 0 else "-"}{memory.fmt_bytes(abs(traced_delta))}'
+            lines.append(line)
+
+        em = discord.Embed(title=':floppy_disk: Memory diff', color=self.color,
+                           description='```\n{}```'.format('\n'.join(lines)[-1900:]))
+        await ctx.send(embed=em)
+
+
+def setup(bot):
+    bot.add_cog(Perf(bot))
@@ -9,14 +9,13 @@ Google blocks me because they hate me personally.
 class RIS(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.aiohttp_session = bot.aio_session
+        self.http_client = bot.http_client
         self.gyaku_url = 'http://localhost:8000/search'
 
     @commands.command(aliases=['ris'])
     async def reverse_image_search(self, ctx, *, url: str):
         """ Do a google reverse image search """
-        async with self.aiohttp_session.post(self.gyaku_url, data=url) as r:
-            resp_data = await r.text()
+        resp_data = await self.http_client.post_text(self.gyaku_url, data=url)
 
         await ctx.send(f'```{resp_data}```')
         # if resp_data['error'] is not None:
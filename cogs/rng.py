@@ -1,27 +1,22 @@
 import discord
 import random
-import json
 from discord.ext import commands
-from bs4 import BeautifulSoup
-from utils import aiohttp_wrap as aw
 
 
 class RNG(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.session = bot.aio_session
+        self.http_client = bot.http_client
         self.fact_url = 'http://www.unkno.com/'
         self.react_url = 'http://api.chew.pro/trbmb'
 
     @commands.command(aliases=['facts'])
     async def fact(self, ctx):
         """ Get a random fun fact (potentially NSFW) """
-        html = await aw.aio_get_text(self.session, self.fact_url)
-        soup = BeautifulSoup(html, 'lxml')
-
+        found = await self.http_client.extract(self.fact_url, {'fact': 'div#content'})
         try:
-            fun_fact = soup.find('div', id='content').text.strip()
-        except AttributeError:
+            fun_fact = found['fact'].strip()
+        except (TypeError, AttributeError):
             return await ctx.send(random.choice(['Sorry, I get nervous in front of crowds',
                                                  "Oh god, I'm blanking",
                                                  "Just a second, I'll think of something...",
@@ -35,9 +30,12 @@ class RNG(commands.Cog):
     @commands.command(aliases=['re'])
     async def react(self, ctx):
         """ Have qtbot react with something inane """
-        # Have to get text because it has the wrong content-type
-        resp = await aw.aio_get_text(self.session, self.react_url)
-        reaction = json.loads(resp)[0]
+        # get_json doesn't mind that this has the wrong content-type
+        resp = await self.http_client.get_json(self.react_url)
+        if not resp:
+            return await ctx.error('Sorry, I couldn\'t think of anything.')
+
+        reaction = resp[0]
         await ctx.send(f'{reaction}!')
 
 
@@ -1,17 +1,15 @@
 import discord
-import json
 from discord.ext import commands
 import tmdbsimple as tmdb
 
-
-# TMDb key
-with open('data/apikeys.json') as f:
-    tmdb.API_KEY = json.load(f)['tmdb']
+from utils.cache import NOT_FOUND, cached, fields
 
 
 class MyTMDb(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # TMDb key
+        tmdb.API_KEY = bot.api_keys['tmdb']
 
     def sync_get_tmdb(query: str, type_search: str):
         """ Non async tmdb library function """
@@ -34,12 +32,21 @@ class MyTMDb(commands.Cog):
 
         return None
 
+    # Results for a day, searches with no results for an hour
+    @cached('tmdb', ttl=24 * 60 * 60, negative_ttl=60 * 60,
+            project=fields('name', 'title', 'first_air_date', 'release_date', 'overview', 'poster_path',
+                           'vote_average'))
+    async def search(self, type_search: str, query: str):
+        """ Returns the top result for a 'tv' or 'movie' search """
+        # Must run_in_executor for blocking libraries
+        result = await self.bot.loop.run_in_executor(None, MyTMDb.sync_get_tmdb, query, type_search)
+        return result or NOT_FOUND
+
     @commands.command(name='show', aliases=['ss', 'tv'])
     async def get_show(self, ctx, *, query):
         """ Get TV show information """
 
-        # Must run_in_executor for blocking libraries
-        result = await self.bot.loop.run_in_executor(None, MyTMDb.sync_get_tmdb, query, 'tv')
+        result = await self.search('tv', query)
 
         # If no result are found
         if not result:
@@ -70,8 +77,7 @@ class MyTMDb(commands.Cog):
     async def get_movie(self, ctx, *, query):
         """ Get movie information """
 
-        # Must run_in_executor for blocking libraries
-        result = await self.bot.loop.run_in_executor(None, MyTMDb.sync_get_tmdb, query, 'movie')
+        result = await self.search('movie', query)
 
         if not result:
             return await ctx.send("Sorry, couldn't find that one.")
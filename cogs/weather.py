@@ -1,21 +1,24 @@
-import json
-
 import discord
-from bs4 import BeautifulSoup
 from discord.ext import commands
 
-from utils import aiohttp_wrap as aw
+from utils.cache import cached
+from utils.html_stream import Target
 from utils.user_funcs import PGDB
 
 
 class Weather(commands.Cog):
+    # What's scraped off Bing's weather answer, the download stops once all of it has been seen.
+    # Only the first two forecast days are ever shown.
+    TARGETS = {'loc': 'div.wtr_locTitle', 'temp': 'div.wtr_currTemp', 'precip': 'div.wtr_currPerci',
+               'img_url': Target('img.wtr_currImg', attr='src'), 'curr_cond': 'div.wtr_caption',
+               'wind': 'div.wtr_currWind', 'humidity': 'div.wtr_currHumi',
+               'forecast': Target('div.wtr_forecastDay', attr='aria-label', limit=2)}
+
     def __init__(self, bot):
         self.bot = bot
-        self.aio_session = bot.aio_session
-        self.redis_client = bot.redis_client
+        self.http_client = bot.http_client
         self.db = PGDB(bot.pg_con)
         self.color = 0xb1d9f4
-        self.cache_ttl = 3600
         self.url = 'http://bing.com/search'
         # Oh uh, this will make more sense later
         self.states = {"Alabama","Alaska","Arizona","Arkansas","California","Colorado",
@@ -34,6 +37,8 @@ class Weather(commands.Cog):
     @staticmethod
     def f2c(weather_data: dict) -> dict:
         """ Converts F to C and returns the dict anew """
+        # Copy first, the original is shared through the cache
+        weather_data = {**weather_data, 'weather': dict(weather_data['weather'])}
         # Celsius conversion
         weather_data['weather']['temp'] = int((weather_data['weather']['temp'] - 32) * (5 / 9))
         # MPH -> M/s
@@ -41,20 +46,19 @@ class Weather(commands.Cog):
 
         return weather_data
 
-    def get_weather_json(self, html: str) -> dict:
-        """ Returns a dict representation of Bing weather """
-        soup = BeautifulSoup(html, 'lxml')
+    def get_weather_json(self, found: dict) -> dict:
+        """ Returns a dict representation of Bing weather from the scraped TARGETS """
         data = {
             'weather': {
-                'loc': soup.find('div', class_='wtr_locTitle').text,
-                'temp': int(soup.find('div', class_='wtr_currTemp').text),
-                'precip': soup.find('div', class_='wtr_currPerci').text.split(': ')[-1],
-                'img_url': soup.find('img', class_='wtr_currImg')['src'],
-                'curr_cond': soup.find('div', class_='wtr_caption').text,
-                'wind': int(soup.find('div', class_='wtr_currWind').text.split(': ')[-1].split(' ')[0]),
-                'humidity': soup.find('div', class_='wtr_currHumi').text.split(': ')[-1]},
-
-            'forecast': [x['aria-label'] for x in soup.find_all('div', class_='wtr_forecastDay')]
+                'loc': found['loc'],
+                'temp': int(found['temp']),
+                'precip': found['precip'].split(': ')[-1],
+                'img_url': found['img_url'],
+                'curr_cond': found['curr_cond'],
+                'wind': int(found['wind'].split(': ')[-1].split(' ')[0]),
+                'humidity': found['humidity'].split(': ')[-1]},
+
+            'forecast': found['forecast']
         }
         # This bit checks for a union of the sets
         # Evaluates to False if the union is not an empty set, True otherwise
@@ -62,6 +66,20 @@ class Weather(commands.Cog):
 
         return data
 
+    @cached('weather', ttl=3600)
+    async def fetch_weather(self, location: str):
+        """ Scrapes the weather for a location, None if it couldn't be found """
+        found = await self.http_client.extract(self.url, self.TARGETS, headers=self.headers,
+                                               params={'q': f'weather {location}'})
+        if found is None:
+            return None
+
+        try:
+            return self.get_weather_json(found)
+        except (AttributeError, TypeError):
+            # Something's missing, not a location Bing knows
+            return None
+
     @commands.command(aliases=['az', 'al'])
     async def add_location(self, ctx, *, location: str):
         """ Add your location (zip, city, etc) to qtbot's database so 
@@ -84,20 +102,9 @@ class Weather(commands.Cog):
                 return await ctx.error("You don't have a location saved!",
                                        description="Feel free to use `al` to add your location, or supply one to the command.")
 
-        redis_key = f'{location}:weather'
-        if await self.redis_client.exists(redis_key):
-            raw_weather_str = await self.redis_client.get(redis_key)
-            weather_data = json.loads(raw_weather_str)
-        else:
-
-            resp = await aw.aio_get_text(self.aio_session, self.url, headers=self.headers,
-                                         params={'q': f'weather {location}'})
-            try:
-                weather_data = self.get_weather_json(resp)
-            except AttributeError:
-                return await ctx.error("Couldn't find that location.")
-
-            await self.redis_client.set(redis_key, json.dumps(weather_data), ex=self.cache_ttl)
+        weather_data = await self.fetch_weather(location)
+        if weather_data is None:
+            return await ctx.error("Couldn't find that location.")
 
         # Make SI conversions if needed
         if weather_data['needs_conversion']:
@@ -129,16 +136,9 @@ class Weather(commands.Cog):
                 return await ctx.send("You don't have a location saved!",
                                       description="Feel free to use `al` to add your location, or supply one to the command")
 
-        redis_key = f'{location}:weather'
-        if await self.redis_client.exists(redis_key):
-            raw_weather_str = await self.redis_client.get(redis_key)
-            weather_data = json.loads(raw_weather_str)
-        else:
-            resp = await aw.aio_get_text(self.aio_session, self.url, headers=self.headers,
-                                         params={'q': f'weather {location}'})
-            weather_data = self.get_weather_json(resp)
-
-            await self.redis_client.set(redis_key, json.dumps(weather_data), ex=self.cache_ttl)
+        weather_data = await self.fetch_weather(location)
+        if weather_data is None:
+            return await ctx.error("Couldn't find that location.")
 
         await ctx.send('\n'.join([x.replace('°', '°F') for x in weather_data['forecast'][:2]]))
 
@@ -1,6 +1,7 @@
 import discord
 from discord.ext import commands
-from utils import aiohttp_wrap as aw
+
+from utils.cache import NOT_FOUND, cached
 
 
 class Wiki(commands.Cog):
@@ -9,7 +10,21 @@ class Wiki(commands.Cog):
         self.search_uri = 'http://en.wikipedia.org/w/api.php?action=opensearch&format=json&search={}'
         self.random_uri = 'https://en.wikipedia.org/w/api.php?action=query&list=random&format=json&rnnamespace=0&rnlimit=1'
         self.headers = {'user-agent': 'qtbot/1.0 - A friendly discord bot (https://github.com/Naught0/qtbot)'}
-        self.aio_session = bot.aio_session
+        self.http_client = bot.http_client
+
+    # Only searches which found nothing are cached, for 10 minutes
+    @cached('wiki', ttl=0, negative_ttl=600)
+    async def search(self, formatted_query: str):
+        """ Returns [title, description, url] of the closest article """
+        wiki_info = await self.http_client.get_json(self.search_uri.format(formatted_query), headers=self.headers)
+        if wiki_info is None:
+            return None
+
+        # No result found
+        if not wiki_info[1]:
+            return NOT_FOUND
+
+        return [wiki_info[1][0], wiki_info[2][0], wiki_info[3][0]]
 
     @commands.command(name='wiki', aliases=['wi'])
     async def wiki_search(self, ctx, *, query=None):
@@ -17,26 +32,28 @@ class Wiki(commands.Cog):
 
         # Determine whether we want a random article
         if not query:
-            random_response = await aw.aio_get_json(self.aio_session, self.random_uri, headers=self.headers)
+            random_response = await self.http_client.get_json(self.random_uri, headers=self.headers)
+            if random_response is None:
+                return await ctx.error("Sorry, I couldn't reach Wikipedia.")
             query = random_response['query']['random'][0]['title']
 
         # Spaces -> +
         formatted_query = query.replace(' ', '+')
 
         # Get wiki page
-        wiki_info = await aw.aio_get_json(self.aio_session, self.search_uri.format(formatted_query), headers=self.headers)
-
-        # No result found
-        if not wiki_info[1]:
+        article = await self.search(formatted_query)
+        if article is None:
             return await ctx.send(f"Sorry, I couldn't find anything for `{query}`.")
 
+        title, description, url = article
+
         # Create embed
-        em = discord.Embed(title=wiki_info[1][0], color=discord.Color.blue())
-        if wiki_info[2][0] == '':
+        em = discord.Embed(title=title, color=discord.Color.blue())
+        if description == '':
             em.description = 'Disambiguation / Redirect Page'
         else:
-            em.description = wiki_info[2][0]
-        em.url = wiki_info[3][0]
+            em.description = description
+        em.url = url
         em.set_thumbnail(url='https://lh5.ggpht.com/1Erjb8gyF0RCc9uhnlfUdbU603IgMm-G-Y3aJuFcfQpno0N4HQIVkTZERCTo65Iz2II=w300')
 
         await ctx.send(embed=em)
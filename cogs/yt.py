@@ -6,10 +6,11 @@ from discord.ext import commands
 class YouTube(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.api_key = bot.api_keys['youtube']
 
-    def sync_get_youtube_video(query):
+    def sync_get_youtube_video(query, api_key):
         """ Sync youtube function (lib uses requests) """
-        return yt.get_video_info(query, num_results=1)
+        return yt.get_video_info(query, num_results=1, api_key=api_key)
 
     @commands.command(name='yt')
     async def get_youtube_video(self, ctx, *, query):
@@ -18,8 +19,9 @@ class YouTube(commands.Cog):
         if not query:
             return await ctx.send('Go on, search something.')
 
+        await self.bot.ratelimiter.acquire('youtube')
         # Executor for sync function
-        video_list = await self.bot.loop.run_in_executor(None, YouTube.sync_get_youtube_video, query)
+        video_list = await self.bot.loop.run_in_executor(None, YouTube.sync_get_youtube_video, query, self.api_key)
 
         if not video_list:
             return await ctx.say(f"Sorry, couldn't find anything for `{query}`")
@@ -1,14 +1,148 @@
+import argparse
+import json
+import multiprocessing
+import time
+
+import requests
+
 from bot import QTBot
-import sys
+from cog_worker import run_cog_worker
+
+# A worker which stays up this long gets its restart backoff reset
+STABLE_AFTER = 60
+# Discord allows one IDENTIFY every 5 seconds, so stagger each worker's shards
+IDENTIFY_DELAY = 5
+# Cogs that --cog-workers moves out of the gateway processes by default
+REMOTE_COGS = 'weather,ask,osrs,news'
 
-def main():
-    try:
-        config_file = sys.argv[1]
-    except:
-        config_file = 'data/apikeys.json'
 
-    bot = QTBot(config_file)
+def run_worker(config_file: str, options: dict, cluster_id: int, shard_ids: list, shard_count: int):
+    """ Entry point of a cluster worker process """
+    bot = QTBot(config_file, cluster_id=cluster_id, shard_ids=shard_ids, shard_count=shard_count, **options)
     bot.run()
 
+
+def recommended_shards(config_file: str) -> int:
+    """ Asks Discord how many shards the bot should be using """
+    with open(config_file) as f:
+        token = json.load(f)['discord']
+
+    r = requests.get('https://discordapp.com/api/v7/gateway/bot', headers={'Authorization': f'Bot {token}'})
+    r.raise_for_status()
+
+    return r.json()['shards']
+
+
+def split_shards(shard_count: int, workers: int) -> list:
+    """ Splits shard ids into `workers` contiguous ranges """
+    shards = list(range(shard_count))
+    return [shards[i * shard_count // workers:(i + 1) * shard_count // workers] for i in range(workers)]
+
+
+class Supervisor:
+    """ Starts one process per shard range, plus `cog_workers` cog worker processes, and restarts any that die """
+
+    def __init__(self, config_file: str, options: dict, workers: int, shard_count: int, cog_workers: int = 0):
+        self.config_file = config_file
+        # Extra QTBot keyword args for every worker
+        self.options = options
+        self.shard_count = shard_count
+        self.shard_ranges = split_shards(shard_count, min(workers, shard_count))
+        self.cog_workers = cog_workers
+        self.mp = multiprocessing.get_context('spawn')
+        # Keyed by ('cluster', id) or ('cog worker', id)
+        self.procs = {}
+        self.started_at = {}
+        self.backoff = {}
+        # When each dead worker is due to be restarted
+        self.restart_at = {}
+
+    def start(self, key: tuple):
+        kind, worker_id = key
+        if kind == 'cog worker':
+            proc = self.mp.Process(target=run_cog_worker, name=f'qtbot-cogs-{worker_id}',
+                                   args=(self.config_file, self.options, worker_id))
+            proc.start()
+            print(f'Started cog worker {worker_id} (pid {proc.pid})')
+        else:
+            shard_ids = self.shard_ranges[worker_id]
+            proc = self.mp.Process(target=run_worker, name=f'qtbot-cluster-{worker_id}',
+                                   args=(self.config_file, self.options, worker_id, shard_ids, self.shard_count))
+            proc.start()
+            print(f'Started cluster {worker_id} (pid {proc.pid}) with shards {shard_ids[0]}-{shard_ids[-1]}')
+
+        self.procs[key] = proc
+        self.started_at[key] = time.monotonic()
+
+    def check(self):
+        """ Restarts dead workers with an exponential backoff, without holding up the others """
+        now = time.monotonic()
+        for key, proc in list(self.procs.items()):
+            if proc.is_alive():
+                if now - self.started_at[key] > STABLE_AFTER:
+                    self.backoff[key] = 1
+                continue
+
+            if key not in self.restart_at:
+                delay = self.backoff.get(key, 1)
+                kind, worker_id = key
+                print(f'{kind.capitalize()} {worker_id} exited with code {proc.exitcode}, restarting in {delay}s')
+                self.restart_at[key] = now + delay
+                self.backoff[key] = min(delay * 2, 300)
+            elif now >= self.restart_at[key]:
+                del self.restart_at[key]
+                self.start(key)
+
+    def stop(self):
+        for proc in self.procs.values():
+            proc.terminate()
+        for proc in self.procs.values():
+            proc.join(timeout=10)
+
+    def run(self):
+        try:
+            # Up first so the gateways have somewhere to forward commands once they're ready
+            for worker_id in range(self.cog_workers):
+                self.start(('cog worker', worker_id))
+
+            for cluster_id, shard_ids in enumerate(self.shard_ranges):
+                self.start(('cluster', cluster_id))
+                time.sleep(IDENTIFY_DELAY * len(shard_ids))
+
+            while True:
+                self.check()
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run qtbot')
+    parser.add_argument('config_file', nargs='?', default='data/apikeys.json')
+    parser.add_argument('--lazy', action='store_true',
+                        help='Only load a cog the first time one of its commands is used')
+    parser.add_argument('--cluster', type=int, metavar='N',
+                        help='Run N worker processes, each owning a range of shards')
+    parser.add_argument('--shards', type=int,
+                        help="Total shard count (defaults to Discord's recommendation in cluster mode)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Trace allocations with tracemalloc so qt.memory can attribute them (slower)')
+    parser.add_argument('--cog-workers', type=int, default=0, metavar='N',
+                        help='Run the --remote-cogs in N separate worker processes')
+    parser.add_argument('--remote-cogs', default=REMOTE_COGS,
+                        help=f'Comma separated cogs to run in the cog workers (default {REMOTE_COGS})')
+    args = parser.parse_args()
+    options = {'lazy_load': args.lazy, 'trace_memory': args.trace_memory,
+               'remote_cogs': args.remote_cogs.split(',') if args.cog_workers else [], 'cog_workers': args.cog_workers}
+
+    if args.cluster or args.cog_workers:
+        shard_count = args.shards or recommended_shards(args.config_file)
+        Supervisor(args.config_file, options, args.cluster or 1, shard_count, cog_workers=args.cog_workers).run()
+    else:
+        bot = QTBot(args.config_file, shard_count=args.shards, **options)
+        bot.run()
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,110 @@
+import math
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.cache import RELEASE_LOCK  # noqa: E402
+from utils.ratelimit import TAKE_TOKEN  # noqa: E402
+
+
+class FakeRedis:
+    """ Just enough of an aredis client for the cache and the rate limiter, in memory
+
+    eval() runs Python versions of the scripts they use. `calls` counts every command. """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.calls = []
+        self.fail = False
+
+    def _alive(self, key) -> bool:
+        expires = self.expires.get(key)
+        if expires is not None and time.monotonic() >= expires:
+            del self.data[key]
+            del self.expires[key]
+        return key in self.data
+
+    def _call(self, name: str):
+        self.calls.append(name)
+        if self.fail:
+            raise ConnectionError('redis is down')
+
+    async def get(self, key):
+        self._call('get')
+        return self.data[key] if self._alive(key) else None
+
+    async def set(self, key, value, nx=False, px=None):
+        self._call('set')
+        if nx and self._alive(key):
+            return None
+
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if px is not None:
+            self.expires[key] = time.monotonic() + px / 1000
+        return True
+
+    async def exists(self, key):
+        self._call('exists')
+        return self._alive(key)
+
+    async def delete(self, key):
+        self._call('delete')
+        self.expires.pop(key, None)
+        return int(self.data.pop(key, None) is not None)
+
+    async def eval(self, script, numkeys, *args):
+        self._call('eval')
+        keys, argv = args[:numkeys], args[numkeys:]
+        if script == RELEASE_LOCK:
+            if self._alive(keys[0]) and self.data[keys[0]] == argv[0]:
+                return await self.delete(keys[0])
+            return 0
+
+        if script == TAKE_TOKEN:
+            rate, capacity, now = (float(x) for x in argv)
+            tokens, ts = self.data.get(keys[0], (capacity, now))
+            tokens = min(capacity, tokens + max(0, now - ts) * rate)
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = math.ceil((1 - tokens) / rate)
+            self.data[keys[0]] = (tokens, now)
+            return wait
+
+        raise NotImplementedError(script)
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+class FakeClock:
+    """ Stands in for the `time` module, only moving when told to """
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
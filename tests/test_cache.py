@@ -0,0 +1,169 @@
+import asyncio
+
+from utils.cache import Cache, NOT_FOUND
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class Fetch:
+    """ A fetch which counts its calls and returns `values` in turn, after `delay` seconds """
+
+    def __init__(self, *values, delay: float = 0):
+        self.values = list(values)
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.values.pop(0) if len(self.values) > 1 else self.values[0]
+
+
+def test_miss_is_fetched_and_cached(redis):
+    async def main():
+        cache = Cache(redis)
+        fetch = Fetch({'price': 1})
+        assert await cache.get_or_fetch('btc', None, fetch, ttl=60) == {'price': 1}
+        cache.local.clear()
+        assert await cache.get_or_fetch('btc', None, fetch, ttl=60) == {'price': 1}
+        return cache, fetch
+
+    cache, fetch = run(main())
+    assert fetch.calls == 1
+    assert cache.stats['redis_hit'] == 1
+
+
+def test_failed_fetch_is_not_cached(redis):
+    async def main():
+        cache = Cache(redis)
+        fetch = Fetch(None, 'ok')
+        assert await cache.get_or_fetch('btc', None, fetch, ttl=60) is None
+        assert await cache.get_or_fetch('btc', None, fetch, ttl=60) == 'ok'
+        return fetch
+
+    assert run(main()).calls == 2
+
+
+def test_concurrent_misses_share_one_fetch(redis):
+    async def main():
+        cache = Cache(redis)
+        fetch = Fetch('value', delay=0.05)
+        results = await asyncio.gather(*(cache.get_or_fetch('ns', 'k', fetch, ttl=60) for _ in range(5)))
+        return cache, fetch, results
+
+    cache, fetch, results = run(main())
+    assert results == ['value'] * 5
+    assert fetch.calls == 1
+    assert cache.stats['coalesced'] == 4
+
+
+def test_waits_for_the_process_holding_the_lock(redis):
+    async def main():
+        cache = Cache(redis, poll_interval=0.01)
+        other = Cache(redis)
+        fetch = Fetch('ours')
+        await redis.set('lock:cache:ns:k', 'other process', nx=True, px=5000)
+
+        async def other_process_finishes():
+            await asyncio.sleep(0.05)
+            await other.set('ns', 'k', 'theirs', ttl=60)
+            await redis.delete('lock:cache:ns:k')
+
+        value, _ = await asyncio.gather(cache.get_or_fetch('ns', 'k', fetch, ttl=60), other_process_finishes())
+        return cache, fetch, value
+
+    cache, fetch, value = run(main())
+    assert value == 'theirs'
+    assert fetch.calls == 0
+    assert cache.stats['lock_wait'] == 1
+
+
+def test_gives_up_on_a_lock_holder_after_lock_ttl(redis):
+    async def main():
+        cache = Cache(redis, lock_ttl=0.1, poll_interval=0.01)
+        fetch = Fetch('ours')
+        # Held by a process which never finishes, nor releases it
+        await redis.set('lock:cache:ns:k', 'stuck process', nx=True, px=5000)
+        value = await cache.get_or_fetch('ns', 'k', fetch, ttl=60)
+        return fetch, value
+
+    fetch, value = run(main())
+    assert value == 'ours'
+    assert fetch.calls == 1
+    # Never released, it isn't ours
+    assert redis.data['lock:cache:ns:k'] == 'stuck process'
+
+
+def test_lock_is_released_after_fetching(redis):
+    async def main():
+        cache = Cache(redis)
+        await cache.get_or_fetch('ns', 'k', Fetch('value'), ttl=60)
+
+    run(main())
+    assert 'lock:cache:ns:k' not in redis.data
+
+
+def test_stale_value_is_served_while_refreshed(redis):
+    async def main():
+        cache = Cache(redis)
+        fetch = Fetch('old', 'new', delay=0.02)
+        assert await cache.get_or_fetch('ns', 'k', fetch, ttl=0.05, stale_ttl=60) == 'old'
+        await asyncio.sleep(0.1)
+
+        # Past its soft TTL: served straight away, refreshed in the background
+        assert await cache.get_or_fetch('ns', 'k', fetch, ttl=0.05, stale_ttl=60) == 'old'
+        await asyncio.sleep(0.05)
+        assert fetch.calls == 2
+        assert await cache.get_or_fetch('ns', 'k', fetch, ttl=0.05, stale_ttl=60) == 'new'
+        return cache
+
+    cache = run(main())
+    assert cache.stats['stale'] == 1
+
+
+def test_not_found_is_cached_for_negative_ttl(redis):
+    async def main():
+        cache = Cache(redis)
+        fetch = Fetch(NOT_FOUND)
+        for _ in range(3):
+            assert await cache.get_or_fetch('wiki', 'nothing', fetch, ttl=0, negative_ttl=600) is None
+        return cache, fetch
+
+    cache, fetch = run(main())
+    assert fetch.calls == 1
+    assert cache.stats['negative_hit'] == 2
+
+
+def test_not_found_without_negative_ttl_is_not_cached(redis):
+    async def main():
+        cache = Cache(redis)
+        fetch = Fetch(NOT_FOUND)
+        for _ in range(2):
+            assert await cache.get_or_fetch('wiki', 'nothing', fetch, ttl=60) is None
+        return fetch
+
+    assert run(main()).calls == 2
+
+
+def test_negative_entry_expires(redis):
+    async def main():
+        cache = Cache(redis)
+        fetch = Fetch(NOT_FOUND, 'found')
+        assert await cache.get_or_fetch('wiki', 'k', fetch, ttl=60, negative_ttl=0.05) is None
+        await asyncio.sleep(0.1)
+        return await cache.get_or_fetch('wiki', 'k', fetch, ttl=60, negative_ttl=0.05)
+
+    assert run(main()) == 'found'
+
+
+def test_projection_is_applied_before_caching(redis):
+    async def main():
+        cache = Cache(redis)
+        fetch = Fetch({'keep': 1, 'drop': 2})
+        await cache.get_or_fetch('ns', 'k', fetch, ttl=60, project=lambda d: {'keep': d['keep']})
+        cache.local.clear()
+        return await cache.get('ns', 'k')
+
+    assert run(main()) == {'keep': 1}
@@ -0,0 +1,83 @@
+import pytest
+
+from utils import circuit_breaker
+from utils.circuit_breaker import CircuitBreaker, UpstreamUnavailable
+
+
+@pytest.fixture
+def breaker(clock, monkeypatch):
+    monkeypatch.setattr(circuit_breaker, 'time', clock)
+    return CircuitBreaker('example.com', failure_threshold=3, window=60, reset_timeout=30, slow_call=5)
+
+
+def fail(breaker, times: int = 1):
+    for _ in range(times):
+        assert breaker.allow()
+        breaker.record(False, 0.1)
+
+
+def test_opens_after_threshold_failures(breaker):
+    fail(breaker, 2)
+    assert breaker.state == 'closed'
+    fail(breaker)
+    assert breaker.state == 'open'
+    assert breaker.times_opened == 1
+
+    assert not breaker.allow()
+    with pytest.raises(UpstreamUnavailable) as e:
+        breaker.check()
+    assert e.value.retry_after == 30
+
+
+def test_failures_outside_the_window_are_forgotten(breaker, clock):
+    fail(breaker, 2)
+    clock.advance(61)
+    fail(breaker)
+    assert breaker.state == 'closed'
+
+
+def test_slow_calls_count_as_failures(breaker):
+    for _ in range(3):
+        breaker.record(True, 6)
+    assert breaker.state == 'open'
+
+
+def test_half_open_lets_one_probe_through(breaker, clock):
+    fail(breaker, 3)
+    clock.advance(30)
+
+    assert breaker.allow()
+    assert breaker.state == 'half_open'
+    # The probe hasn't reported back yet
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes(breaker, clock):
+    fail(breaker, 3)
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.record(True, 0.1)
+
+    assert breaker.state == 'closed'
+    # Starts counting failures from scratch
+    fail(breaker, 2)
+    assert breaker.state == 'closed'
+
+
+def test_failed_probe_reopens(breaker, clock):
+    fail(breaker, 3)
+    clock.advance(30)
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+
+    assert breaker.state == 'open'
+    assert breaker.times_opened == 2
+    assert breaker.retry_after() == 30
+
+
+def test_probe_which_never_reports_back_is_replaced(breaker, clock):
+    fail(breaker, 3)
+    clock.advance(30)
+    assert breaker.allow()
+    clock.advance(30)
+    assert breaker.allow()
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from utils import ratelimit
+from utils.ratelimit import RateLimited, RateLimiter, TokenBucket
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture(autouse=True)
+def frozen(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, 'time', clock)
+
+
+def test_bucket_starts_full(clock):
+    bucket = TokenBucket(rate=1, capacity=3)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == pytest.approx(1)
+
+
+def test_bucket_refills_at_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+    bucket.take()
+    bucket.take()
+    assert bucket.take() == pytest.approx(0.5)
+
+    clock.advance(0.5)
+    assert bucket.take() == 0
+    assert bucket.take() == pytest.approx(0.5)
+
+
+def test_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(rate=1, capacity=2)
+    bucket.take()
+    clock.advance(100)
+    assert [bucket.take() for _ in range(2)] == [0, 0]
+    assert bucket.take() > 0
+
+
+def test_give_back_returns_a_token(clock):
+    bucket = TokenBucket(rate=1, capacity=1)
+    bucket.take()
+    bucket.give_back()
+    assert bucket.take() == 0
+
+
+def test_global_bucket_is_shared_between_processes(redis):
+    async def main():
+        limits = {'api': (1, 60, 2)}
+        first, second = RateLimiter(redis, limits), RateLimiter(redis, limits)
+        await first.acquire('api')
+        await second.acquire('api')
+        # Both local buckets still have a token, the shared one doesn't
+        with pytest.raises(RateLimited):
+            await first.acquire('api', wait=False)
+        return first
+
+    limiter = run(main())
+    assert limiter.usage[('api', 'rejected')] == 1
+    # The local token was given back when the global bucket said no
+    assert limiter.buckets['api'].tokens == pytest.approx(1)
+
+
+def test_global_bucket_refills(redis, clock):
+    async def main():
+        limiter = RateLimiter(redis, {'api': (1, 1, 1)})
+        await limiter.acquire('api')
+        clock.advance(1)
+        await limiter.acquire('api', wait=False)
+        return limiter
+
+    assert run(main()).usage[('api', 'acquired')] == 2
+
+
+def test_rejects_waits_longer_than_max_wait(redis):
+    async def main():
+        limiter = RateLimiter(redis, {'api': (1, 60, 1)})
+        await limiter.acquire('api')
+        with pytest.raises(RateLimited) as e:
+            await limiter.acquire('api', max_wait=10)
+        return e.value
+
+    assert run(main()).retry_after == pytest.approx(60)
+
+
+def test_local_bucket_is_used_without_redis(redis):
+    redis.fail = True
+
+    async def main():
+        limiter = RateLimiter(redis, {'api': (1, 60, 1)})
+        await limiter.acquire('api')
+        with pytest.raises(RateLimited):
+            await limiter.acquire('api', wait=False)
+
+    run(main())
+
+
+def test_unlimited_names_go_straight_through(redis):
+    run(RateLimiter(redis, {}).acquire('nothing'))
+    assert redis.calls == []
@@ -0,0 +1,274 @@
+import asyncio
+import functools
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from utils import deadline
+from utils import http_client
+from utils.circuit_breaker import UpstreamUnavailable
+from utils.codec import Codec
+from utils.metrics import registry
+
+# Returned by Cache.get when there's nothing cached, since None is a perfectly cacheable value
+MISSING = object()
+# Returned by a fetch when the upstream definitely has nothing, as opposed to None for a failure
+NOT_FOUND = object()
+
+# Deletes a lock only if we still hold it, it may have expired and been taken by someone else
+RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class Cache:
+    """ A two-tier cache: a bounded LRU in this process in front of redis
+
+    Values are JSON-able and stored in redis under `cache:<namespace>:<key>`, encoded by `codec`
+    together with their expiry times and the validators of the responses they were built from -- so `redis` must not decode responses. A hit is a single
+    GET, and the local tier keeps nothing longer than `max_local_ttl` seconds so processes sharing
+    the redis don't drift apart for long. Cached objects are shared between callers, don't mutate
+    them.
+
+    Each value has a soft TTL (`ttl`) and may be kept for `stale_ttl` seconds after it, during
+    which get_or_fetch serves it straight away and refreshes it in the background -- with GETs
+    conditional on those validators (see http_client.Validators), and it carries on being served while its
+    upstream's circuit breaker is open. A namespace can declare a projection so only the fields a
+    cog renders are stored. A key is only fetched once at a time across every process sharing the
+    redis, and callers only wait as long as their command's deadline allows (see utils.deadline)
+    while the fetch finishes and is cached without them. """
+
+    def __init__(self, redis, max_size: int = 2048, max_local_ttl: float = 60, ttls: dict = None,
+                 lock_ttl: float = 10, poll_interval: float = 0.05, codec: Codec = None):
+        self.redis = redis
+        self.codec = codec or Codec()
+        self.max_size = max_size
+        self.max_local_ttl = max_local_ttl
+        # Per-namespace TTL overrides from the config file
+        self.ttls = ttls or {}
+        # How long another process may hold a key's fetch lock, and how often to check on it
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.local = OrderedDict()
+        self.stats = Counter()
+        self._inflight = {}
+
+    @staticmethod
+    def redis_key(namespace: str, key) -> str:
+        return f'cache:{namespace}' if key is None else f'cache:{namespace}:{key}'
+
+    def ttl_for(self, namespace: str, default: float) -> float:
+        return self.ttls.get(namespace, default)
+
+    def _remember(self, rkey: str, value, fresh_until: float, expires: float, validators: dict = None):
+        self.local[rkey] = (min(expires, time.time() + self.max_local_ttl), fresh_until, value, validators)
+        self.local.move_to_end(rkey)
+        while len(self.local) > self.max_size:
+            self.local.popitem(last=False)
+
+    def _remember_raw(self, rkey: str, raw: bytes):
+        """ Copies a value read from redis into the local tier and returns (value, is fresh, validators) """
+        # Entries written before validators were stored have none
+        fresh_until, expires, value, *validators = self.codec.decode(raw)
+        validators = validators[0] if validators else None
+        self._remember(rkey, value, fresh_until, expires, validators)
+        return value, fresh_until > time.time(), validators
+
+    async def _lookup(self, rkey: str):
+        """ Returns (value, is fresh, validators), or (MISSING, False, None) """
+        entry = self.local.get(rkey)
+        if entry is not None:
+            local_expires, fresh_until, value, validators = entry
+            now = time.time()
+            if local_expires > now:
+                self.local.move_to_end(rkey)
+                self.stats['local_hit'] += 1
+                return value, fresh_until > now, validators
+            del self.local[rkey]
+
+        raw = await deadline.run('redis', self.redis.get(rkey))
+        if raw is None:
+            self.stats['miss'] += 1
+            return MISSING, False, None
+
+        self.stats['redis_hit'] += 1
+        return self._remember_raw(rkey, raw)
+
+    async def get(self, namespace: str, key=None):
+        """ Returns the cached value, stale or not, or MISSING """
+        value, _, _ = await self._lookup(self.redis_key(namespace, key))
+        return value
+
+    async def set(self, namespace: str, key, value, ttl: float, stale_ttl: float = 0, validators: dict = None):
+        rkey = self.redis_key(namespace, key)
+        fresh_until = time.time() + ttl
+        expires = fresh_until + stale_ttl
+
+        self._remember(rkey, value, fresh_until, expires, validators)
+        await self.redis.set(rkey, self.codec.encode([fresh_until, expires, value, validators]),
+                             px=int((ttl + stale_ttl) * 1000))
+
+    async def delete(self, namespace: str, key=None):
+        rkey = self.redis_key(namespace, key)
+        self.local.pop(rkey, None)
+        await self.redis.delete(rkey)
+
+    async def get_or_fetch(self, namespace: str, key, fetch, ttl: float, stale_ttl: float = 0, project=None,
+                           negative_ttl: float = 0):
+        """ Returns the cached value, or awaits fetch() and caches what it returns
+
+        A None result means the fetch failed, so it's returned but not cached. Otherwise it's
+        passed through `project` (if given) before being cached and returned. A value past its
+        soft TTL is returned as is while a background task fetches a new one.
+
+        fetch() returning NOT_FOUND means the upstream had nothing for this key: None is cached
+        for `negative_ttl` seconds (if given) and returned, so repeated bad queries stay local.
+        With a `ttl` of 0 only those misses are cached.
+
+        Concurrent misses for a key in this process share one fetch, and between processes
+        a short redis lock decides who fetches while the others wait for the result. """
+        rkey = self.redis_key(namespace, key)
+
+        async def load(current=MISSING, previous: dict = None):
+            # Only a refresh has a value for a 304 to keep, so only a refresh sends validators
+            validators = http_client.Validators(previous if current is not MISSING else None)
+            token = http_client.revalidate.set(validators)
+            try:
+                value = await fetch()
+            finally:
+                http_client.revalidate.reset(token)
+
+            if value is http_client.NOT_MODIFIED:
+                if current is MISSING:
+                    return None
+                self.stats['revalidated'] += 1
+                value = current
+            elif value is NOT_FOUND:
+                if negative_ttl:
+                    await self.set(namespace, key, None, negative_ttl)
+                return None
+            elif value is not None and project is not None:
+                value = project(value)
+
+            positive_ttl = self.ttl_for(namespace, ttl)
+            if value is not None and positive_ttl:
+                await self.set(namespace, key, value, positive_ttl, stale_ttl, validators.current or None)
+            return value
+
+        value, fresh, validators = await self._lookup(rkey)
+        if value is not MISSING:
+            if value is None:
+                self.stats['negative_hit'] += 1
+            elif not fresh and rkey not in self._inflight:
+                self.stats['stale'] += 1
+                refresh = self._refresh(rkey, functools.partial(load, value, validators))
+                asyncio.ensure_future(deadline.detached(refresh))
+            return value
+
+        return await self._load_coalesced(rkey, load)
+
+    async def _refresh(self, rkey: str, load):
+        """ Background refresh of a stale value, nobody awaits this so errors are only logged """
+        try:
+            await self._load_coalesced(rkey, load)
+        except UpstreamUnavailable:
+            # Expected while a circuit is open, the stale value carries on being served
+            pass
+        except Exception as e:
+            print(f'Refreshing {rkey} failed: {type(e).__name__} {e}')
+
+    async def _load_coalesced(self, rkey: str, load):
+        task = self._inflight.get(rkey)
+        if task is not None:
+            self.stats['coalesced'] += 1
+        else:
+            # A task of its own, so it isn't cut short by the deadline of whoever happened to start it
+            task = self._inflight[rkey] = asyncio.ensure_future(deadline.detached(self._load_once(rkey, load)))
+            task.add_done_callback(functools.partial(self._load_done, rkey))
+
+        # The load's own spans aren't recorded (see deadline.detached), just how long this caller waited
+        with registry.timer('cache wait', rkey.split(':')[1]):
+            return await deadline.run('cache', asyncio.shield(task))
+
+    def _load_done(self, rkey: str, task):
+        if self._inflight.get(rkey) is task:
+            del self._inflight[rkey]
+        # Everyone waiting on it may have given up, don't warn about an unretrieved exception
+        if not task.cancelled():
+            task.exception()
+
+    async def _load_once(self, rkey: str, load):
+        """ Loads a key under its redis lock, or waits for whichever process holds the lock """
+        lock = f'lock:{rkey}'
+        token = uuid.uuid4().hex
+
+        if not await self.redis.set(lock, token, nx=True, px=int(self.lock_ttl * 1000)):
+            self.stats['lock_wait'] += 1
+            value = await self._wait_for_load(rkey, lock)
+            if value is not MISSING:
+                return value
+            # The other process failed or is taking too long -- fetch it ourselves
+
+        try:
+            # Another process may have stored a fresh value while ours sat in the local tier
+            raw = await self.redis.get(rkey)
+            if raw is not None:
+                value, fresh, _ = self._remember_raw(rkey, raw)
+                if fresh:
+                    self.stats['lock_reread'] += 1
+                    return value
+
+            return await load()
+        finally:
+            await self.redis.eval(RELEASE_LOCK, 1, lock, token)
+
+    async def _wait_for_load(self, rkey: str, lock: str):
+        """ Polls for a value another process is fetching, MISSING if it gives up without one
+
+        While refreshing a stale value this returns the stale value right away, which is fine --
+        the other process is refreshing it. """
+        give_up_at = time.monotonic() + self.lock_ttl
+        while time.monotonic() < give_up_at:
+            await asyncio.sleep(self.poll_interval)
+
+            raw = await self.redis.get(rkey)
+            if raw is not None:
+                value, _, _ = self._remember_raw(rkey, raw)
+                return value
+
+            if not await self.redis.exists(lock):
+                break
+
+        return MISSING
+
+
+def fields(*names):
+    """ A projection keeping only `names` out of a dict """
+    def project(d: dict) -> dict:
+        return {k: d[k] for k in names if k in d}
+
+    return project
+
+
+def cached(namespace: str, ttl: float, stale_ttl: float = 0, project=None, negative_ttl: float = 0):
+    """ Caches a cog method's result in bot.cache, keyed by its arguments
+
+        @cached('btc', ttl=300, project=fields('price_usd', 'last_updated'))
+        async def fetch_price(self): ...
+
+    Like get_or_fetch, a None result isn't cached, a result is passed through `project` before
+    it's stored, with a `stale_ttl` a value past `ttl` is served while it's refreshed in the
+    background, and a NOT_FOUND result is cached as None for `negative_ttl`. """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args):
+            key = ':'.join(str(x) for x in args) if args else None
+            return await self.bot.cache.get_or_fetch(namespace, key, lambda: func(self, *args), ttl, stale_ttl,
+                                                     project, negative_ttl)
+
+        return wrapper
+
+    return decorator
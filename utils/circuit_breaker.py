@@ -0,0 +1,88 @@
+import time
+from collections import deque
+
+
+class UpstreamUnavailable(Exception):
+    """ Raised instead of making a request to a host whose circuit is open """
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f'{host} is unavailable, retrying in {retry_after:.0f}s')
+        self.host = host
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """ Stops requests to an upstream which keeps failing
+
+    closed:    requests go through. `failure_threshold` failures (errors, 5xx / 429 responses, or
+               calls slower than `slow_call` seconds) within `window` seconds open the circuit.
+    open:      requests fail straight away, until `reset_timeout` seconds have passed.
+    half_open: a single probe request is let through. If it works the circuit closes, otherwise
+               it opens again for another `reset_timeout`. """
+
+    def __init__(self, name: str, failure_threshold: int = 5, window: float = 60, reset_timeout: float = 30,
+                 slow_call: float = 5):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self.state = 'closed'
+        self.failures = deque()
+        self.opened_at = 0.0
+        self.probe_started = None
+        self.times_opened = 0
+
+    def check(self):
+        """ Raises UpstreamUnavailable unless a request may be made right now """
+        if not self.allow():
+            raise UpstreamUnavailable(self.name, self.retry_after())
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """ Whether a request may be made right now """
+        if self.state == 'closed':
+            return True
+
+        now = time.monotonic()
+        if self.state == 'open':
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self.state = 'half_open'
+            self.probe_started = None
+
+        # Only one probe at a time -- unless the last one never reported back (e.g. it was cancelled)
+        if self.probe_started is not None and now - self.probe_started < self.reset_timeout:
+            return False
+
+        self.probe_started = now
+        return True
+
+    def record(self, ok: bool, elapsed: float):
+        """ Reports how a request which allow() let through went """
+        now = time.monotonic()
+        if ok and elapsed < self.slow_call:
+            if self.state == 'half_open':
+                self.state = 'closed'
+                self.failures.clear()
+            return
+
+        if self.state == 'half_open':
+            self._open(now)
+            return
+
+        self.failures.append(now)
+        while self.failures and now - self.failures[0] > self.window:
+            self.failures.popleft()
+
+        if self.state == 'closed' and len(self.failures) >= self.failure_threshold:
+            self._open(now)
+
+    def _open(self, now: float):
+        self.state = 'open'
+        self.opened_at = now
+        self.probe_started = None
+        self.times_opened += 1
+        print(f'Circuit for {self.name} opened, next probe in {self.reset_timeout}s')
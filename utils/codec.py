@@ -0,0 +1,81 @@
+import json
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# The first byte of every encoded value says how to decode the rest
+JSON = 0x01
+MSGPACK = 0x02
+COMPRESSED = 0x80
+
+
+def _json_dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def _json_loads(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+def _msgpack_dumps(obj) -> bytes:
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def _msgpack_loads(data: bytes):
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+SERIALIZERS = {JSON: (_json_dumps, _json_loads),
+               MSGPACK: (_msgpack_dumps, _msgpack_loads)}
+
+
+class Codec:
+    """ Turns cached values into bytes and back
+
+    Values are serialized with orjson when it's installed (see benchmarks/cache_codec.py -- it beats
+    msgpack on our data), then msgpack, then the json module, and zlib compressed once they're bigger
+    than `compress_threshold` bytes. A header byte records both choices, so values written with
+    different settings -- or by a process with different libraries installed -- still decode. """
+
+    def __init__(self, serializer: str = None, compress_threshold: int = 1024, level: int = 1):
+        if serializer is None:
+            serializer = 'msgpack' if orjson is None and msgpack is not None else 'json'
+        if serializer == 'msgpack' and msgpack is None:
+            raise RuntimeError('msgpack is not installed')
+
+        self.format = MSGPACK if serializer == 'msgpack' else JSON
+        self.compress_threshold = compress_threshold
+        self.level = level
+
+    def encode(self, obj) -> bytes:
+        header = self.format
+        data = SERIALIZERS[self.format][0](obj)
+
+        if self.compress_threshold is not None and len(data) > self.compress_threshold:
+            data = zlib.compress(data, self.level)
+            header |= COMPRESSED
+
+        return bytes((header,)) + data
+
+    @staticmethod
+    def decode(data: bytes):
+        header = data[0]
+        body = data[1:]
+        if header & COMPRESSED:
+            body = zlib.decompress(body)
+
+        return SERIALIZERS[header & ~COMPRESSED][1](body)
@@ -0,0 +1,69 @@
+import ast
+from pathlib import Path
+
+# Cogs which register listeners / admin tooling rather than (only) commands.
+# These are always loaded up front, even in lazy mode.
+ALWAYS_LOAD = ('error', 'owner')
+
+
+def _decorator_names(func: ast.AsyncFunctionDef):
+    """ Yields (name, aliases) for every @commands.command / @x.command / @commands.group decorator """
+    for deco in func.decorator_list:
+        if not isinstance(deco, ast.Call) or not isinstance(deco.func, ast.Attribute):
+            continue
+
+        if deco.func.attr not in ('command', 'group'):
+            continue
+
+        name = func.name
+        aliases = []
+        for kw in deco.keywords:
+            if kw.arg == 'name' and isinstance(kw.value, ast.Constant):
+                name = kw.value.value
+            elif kw.arg == 'aliases' and isinstance(kw.value, (ast.List, ast.Tuple)):
+                aliases = [x.value for x in kw.value.elts if isinstance(x, ast.Constant)]
+
+        # Only top level commands matter for dispatch -- subcommands are found through their group
+        is_top_level = isinstance(deco.func.value, ast.Name) and deco.func.value.id == 'commands'
+        yield name, aliases, is_top_level
+
+
+def scan_cog(path: Path) -> list:
+    """ Statically reads a cog's source and returns its top level command names + aliases
+    The cog module is never imported, so none of its import-time work is done """
+    tree = ast.parse(path.read_text(encoding='utf8'), filename=str(path))
+
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.AsyncFunctionDef):
+            for name, aliases, is_top_level in _decorator_names(node):
+                if is_top_level:
+                    names.append(name)
+                    names.extend(aliases)
+
+    return names
+
+
+def build_manifest(cog_dir: str = 'cogs') -> dict:
+    """ Maps every (lowercased) command name and alias to the extension which defines it """
+    manifest = {}
+    for path in sorted(Path(cog_dir).glob('*.py')):
+        for name in scan_cog(path):
+            manifest[name.lower()] = f'{cog_dir}.{path.stem}'
+
+    return manifest
+
+
+def scan_data_files(path: Path) -> set:
+    """ Statically reads a cog's source and returns the data files it reads with bot.get_data('<name>') """
+    tree = ast.parse(path.read_text(encoding='utf8'), filename=str(path))
+
+    return {node.args[0].value for node in ast.walk(tree)
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'get_data'
+            and node.args and isinstance(node.args[0], ast.Constant)}
+
+
+def data_files(cogs, cog_dir: str = 'cogs') -> set:
+    """ The data files (see QTBot.DATA_FILES) which any of `cogs` reads """
+    paths = (Path(cog_dir) / f'{cog}.py' for cog in cogs)
+    return set().union(*(scan_data_files(path) for path in paths if path.exists()))
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+from utils import dict_manip as dm
+from utils.metrics import registry
+
+# How each dataset is kept in a worker -- only what the functions below need, prepared once
+PREPARE = {
+    'item_data': list,
+    # (the comic's words, its id) for get_best_match's whole-word matching
+    'xkcd_blob': lambda blob: [(frozenset(words.split()), num) for words, num in blob.items()],
+}
+
+# The datasets of this process: a worker's, or the bot's own when there is no pool
+_datasets = {}
+
+
+def _load_datasets(paths: dict):
+    """ Worker initializer, reads the datasets straight from disk so they're never pickled """
+    for name, path in paths.items():
+        with open(path, encoding='utf8') as f:
+            _datasets[name] = PREPARE[name](json.load(f))
+
+
+def _ping():
+    return True
+
+
+def closest_item(name: str) -> str:
+    """ The OSRS item name closest to `name` by edit distance """
+    return dm.get_closest(_datasets['item_data'], name)
+
+
+def best_comic(query: str):
+    """ (number of whole words matched, comic id) of the xkcd matching `query` best, None if nothing matched """
+    input_set = set(query.lower().split())
+    strength, num = max(((len(words & input_set), num) for words, num in _datasets['xkcd_blob']),
+                        key=lambda match: match[0], default=(0, None))
+
+    return (strength, num) if strength else None
+
+
+def bing_image_links(html: str) -> list:
+    """ The image links off a Bing image search page """
+    root = etree.fromstring(html, etree.HTMLParser())
+    if root is None:
+        return []
+
+    return [x.get('href') for x in root.xpath('//div[@class="content"]//a[@class="thumb"]')]
+
+
+class CPUPool:
+    """ A process pool for CPU-bound work, so it doesn't hold the GIL while other commands wait
+
+    Only module-level functions of this module run in it. The datasets they search (`datasets`
+    maps names in PREPARE to their files) are loaded by each worker when it starts rather than sent
+    along with every call, so reload() -- which replaces the workers -- must be called once a
+    data file is rewritten.
+
+    `queued` is how many calls are waiting or running right now, and every call's time (queueing
+    included) goes into the ('cpu', function) histogram. With `workers` 0 everything runs inline. """
+
+    def __init__(self, loop, datasets: dict, workers: int = 2):
+        self.loop = loop
+        self.datasets = datasets
+        self.workers = workers
+        self.queued = 0
+        self.executor = None
+        self.start()
+
+    def start(self):
+        if not self.workers:
+            _load_datasets(self.datasets)
+            return
+
+        # spawn: forking a process with the event loop's threads and sockets in it isn't safe
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_load_datasets, initargs=(self.datasets,))
+
+    async def warm_up(self):
+        """ Starts the workers now rather than on the first command that needs one """
+        await asyncio.gather(*(self.run(_ping) for _ in range(self.workers)))
+
+    def reload(self):
+        """ Replaces the workers with ones which have read the data files again """
+        old = self.executor
+        self.start()
+        if old is not None:
+            # Calls already submitted still finish on the old workers
+            old.shutdown(wait=False)
+
+    async def run(self, func, *args):
+        self.queued += 1
+        try:
+            with registry.timer('cpu', func.__name__):
+                if self.executor is None:
+                    return func(*args)
+                return await self.loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.queued -= 1
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
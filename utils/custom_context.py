@@ -1,8 +1,24 @@
+import time
+
 import discord
 from discord.ext import commands
 
+from utils import metrics
+
 
 class CustomContext(commands.Context):
+    # Set by QTBot.on_message, used to time the command through to its final send
+    started_at = None
+    last_sent_at = None
+    trace = None
+
+    async def send(self, *args, **kwargs):
+        with metrics.registry.timer('discord', 'send'):
+            message = await super().send(*args, **kwargs)
+        self.last_sent_at = time.perf_counter()
+
+        return message
+
     async def error(self, title: str, description: str = None):
         em = discord.Embed(title=f':no_entry_sign: {title}',
                            color=discord.Color.dark_red(),
@@ -0,0 +1,77 @@
+import asyncio
+import time
+from contextvars import ContextVar
+
+from utils import tracing
+
+# When (time.monotonic()) the command running in this task must have its answer by, None for no limit.
+# Set by QTBot.on_message and read by the HTTP client, the cache and PGDB. Like the tracing vars,
+# it never leaks between commands since discord.py runs every on_message in its own task.
+current = ContextVar('deadline', default=None)
+
+# Seconds a command gets unless the config says otherwise (`command_deadline` / `command_deadlines`)
+DEFAULT_BUDGET = 10
+
+
+class DeadlineExceeded(Exception):
+    """ Raised when a command's time budget runs out before a downstream call finished """
+
+    def __init__(self, what: str):
+        super().__init__(f'Ran out of time waiting for {what}')
+        self.what = what
+
+
+def start(budget: float):
+    """ Gives the current task `budget` seconds from now, returns the token to reset `current` with """
+    return current.set(time.monotonic() + budget)
+
+
+def remaining():
+    """ Seconds left for the current command, or None if it has no deadline """
+    deadline = current.get()
+    if deadline is None:
+        return None
+
+    return max(0.0, deadline - time.monotonic())
+
+
+def expired() -> bool:
+    deadline = current.get()
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def check(what: str):
+    """ Raises DeadlineExceeded if the time is already up """
+    if expired():
+        raise DeadlineExceeded(what)
+
+
+async def run(what: str, aw):
+    """ Awaits `aw`, cancelling it and raising DeadlineExceeded if the deadline passes first """
+    left = remaining()
+    if left is None:
+        return await aw
+
+    if left <= 0:
+        if asyncio.iscoroutine(aw):
+            aw.close()
+        raise DeadlineExceeded(what)
+
+    try:
+        return await asyncio.wait_for(aw, left)
+    except asyncio.TimeoutError:
+        if expired():
+            raise DeadlineExceeded(what) from None
+        raise
+
+
+async def detached(coro):
+    """ Awaits `coro` without any deadline or trace -- run it as a task of its own so the caller's is untouched
+
+    For work whose result is still worth having after whoever started it has given up (e.g. a fetch
+    the cache will store for the next caller). It may outlive the trace of whoever started it, and
+    isn't theirs alone anyway, so its spans aren't recorded -- the callers record their wait. """
+    current.set(None)
+    tracing.current_trace.set(None)
+    tracing.current_span.set(None)
+    return await coro
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import os
+import uuid
+from collections import OrderedDict
+
+
+class GuildSettings:
+    """ A bounded, lazily loaded cache of per-guild settings which stays consistent across processes
+
+    A guild's settings are fetched from postgres the first time that guild is seen, and the least
+    recently used guilds are evicted once `max_size` is reached. When any process changes a guild's
+    settings it publishes the guild id on `INVALIDATE_CHANNEL`; every other process drops its copy
+    and reloads it on next use.
+
+    Each cached entry is a dict. For now it holds
+        prefix -> the guild's custom prefix (or None)
+        prefixes -> the tuple of prefixes to match messages against
+    New settings only need adding to :meth:`_fetch`.
+    """
+    INVALIDATE_CHANNEL = 'qtbot:guild_settings'
+    # How often the listener checks its connection is still up when nothing is being published
+    LISTEN_TIMEOUT = 30
+
+    def __init__(self, bot, default_prefix: str = 'qt.', max_size: int = 10000):
+        self.bot = bot
+        self.default_prefix = default_prefix
+        self.default_prefixes = (default_prefix,)
+        self.max_size = max_size
+        # Lets a process ignore its own invalidations
+        self.origin = f'{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._cache = OrderedDict()
+        self._loading = {}
+        # Bumped by invalidate() while a guild is loading, so a load that raced an invalidation isn't cached
+        self._generations = {}
+
+    def __len__(self):
+        return len(self._cache)
+
+    async def _fetch(self, guild_id: int) -> dict:
+        """ Reads a single guild's settings from the database """
+        prefix = await self.bot.pg_con.fetchval('SELECT prefix FROM custom_prefix WHERE guild_id = $1', guild_id)
+
+        return {'prefix': prefix}
+
+    def _prepare(self, settings: dict) -> dict:
+        if settings.get('prefix'):
+            settings['prefixes'] = (self.default_prefix, settings['prefix'])
+        else:
+            settings['prefixes'] = self.default_prefixes
+
+        return settings
+
+    def _store(self, guild_id: int, settings: dict) -> dict:
+        self._cache[guild_id] = self._prepare(settings)
+        self._cache.move_to_end(guild_id)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+        return settings
+
+    def get_cached(self, guild_id: int):
+        """ Returns the cached settings for a guild, or None if they need loading """
+        settings = self._cache.get(guild_id)
+        if settings is not None:
+            self._cache.move_to_end(guild_id)
+
+        return settings
+
+    async def get(self, guild_id: int) -> dict:
+        """ Returns a guild's settings, loading them if they aren't cached """
+        settings = self.get_cached(guild_id)
+        if settings is not None:
+            return settings
+
+        # Several messages from an uncached guild may arrive at once -- only query once
+        if guild_id in self._loading:
+            return await asyncio.shield(self._loading[guild_id])
+
+        fut = self.bot.loop.create_future()
+        self._loading[guild_id] = fut
+        self._generations[guild_id] = 0
+        try:
+            settings = self._prepare(await self._fetch(guild_id))
+            # Invalidated mid-fetch, the row may already be out of date -- use it once but don't keep it
+            if not self._generations[guild_id]:
+                self._store(guild_id, settings)
+        except Exception as e:
+            fut.set_exception(e)
+            # Nobody else may be waiting on this, don't warn about it
+            fut.exception()
+            raise
+        else:
+            fut.set_result(settings)
+        finally:
+            del self._loading[guild_id]
+            del self._generations[guild_id]
+
+        return settings
+
+    def cached_prefixes(self, guild_id: int):
+        """ The fast path for the message prefilter -- None means the guild isn't loaded yet """
+        settings = self.get_cached(guild_id)
+        return None if settings is None else settings['prefixes']
+
+    async def prefixes(self, guild_id: int = None) -> tuple:
+        if guild_id is None:
+            return self.default_prefixes
+
+        return (await self.get(guild_id))['prefixes']
+
+    async def set_prefix(self, guild_id: int, prefix: str):
+        """ Stores a guild's custom prefix and tells the other processes about it """
+        execute = '''INSERT INTO custom_prefix (guild_id, prefix) VALUES ($1, $2)
+                     ON CONFLICT (guild_id) DO
+                         UPDATE SET prefix = $2;'''
+        await self.bot.pg_con.execute(execute, guild_id, prefix)
+
+        settings = dict(self.get_cached(guild_id) or await self._fetch(guild_id))
+        settings['prefix'] = prefix
+        self._store(guild_id, settings)
+        await self.publish(guild_id)
+
+    def invalidate(self, guild_id: int):
+        self._cache.pop(guild_id, None)
+        if guild_id in self._generations:
+            self._generations[guild_id] += 1
+
+    async def publish(self, guild_id: int):
+        try:
+            await self.bot.redis_client.publish(self.INVALIDATE_CHANNEL,
+                                                json.dumps({'guild_id': guild_id, 'origin': self.origin}))
+        except Exception as e:
+            print(f'Failed to publish guild settings invalidation for {guild_id}: {e}')
+
+    def _resubscribed(self, connection):
+        # Anything could have changed while we weren't subscribed
+        self._cache.clear()
+        for guild_id in self._generations:
+            self._generations[guild_id] += 1
+
+    async def listen(self):
+        """ Drops cached guilds whenever another process invalidates them. Runs forever. """
+        backoff = 1
+        while True:
+            pubsub = self.bot.redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.INVALIDATE_CHANNEL)
+                self._resubscribed(pubsub.connection)
+                # aredis quietly reconnects (and resubscribes) when a read fails, so clear after that too
+                pubsub.connection.register_connect_callback(self._resubscribed)
+                backoff = 1
+
+                while True:
+                    # Unlike get_message, this lets a failed reconnect through to the backoff below
+                    try:
+                        response = await asyncio.wait_for(pubsub.parse_response(block=True), self.LISTEN_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        response = None
+
+                    if response is None:
+                        if not pubsub.connection.is_connected:
+                            raise ConnectionError('pubsub connection closed')
+                        continue
+
+                    message = pubsub.handle_message(response, ignore_subscribe_messages=True)
+                    if message is None or message['type'] != 'message':
+                        continue
+
+                    data = json.loads(message['data'])
+                    if data['origin'] != self.origin:
+                        self.invalidate(data['guild_id'])
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f'Guild settings listener lost its Redis connection ({e}), retrying in {backoff}s')
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+            finally:
+                pubsub.reset()
@@ -0,0 +1,176 @@
+import codecs
+import re
+import time
+
+from lxml import etree
+
+# One compound selector: tag, .class, #id, [attr] and [attr=value], e.g. `img.thumb[typeof=foaf:Image]`
+_SIMPLE = re.compile(r'([\w-]+)|\.([\w-]+)|#([\w-]+)|\[([\w:-]+)(?:=([^\]]+))?\]')
+
+
+class Selector:
+    """ The little bit of CSS the scrapers need: compound selectors joined by descendant combinators """
+    __slots__ = ('text', 'compounds')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.compounds = [self._parse(part) for part in text.split()]
+
+    @staticmethod
+    def _parse(part: str):
+        tag, classes, id_, attrs = None, set(), None, []
+        pos = 0
+        while pos < len(part):
+            m = _SIMPLE.match(part, pos)
+            if m is None:
+                raise ValueError(f'Unsupported selector: {part!r}')
+            if m.group(1):
+                tag = m.group(1)
+            elif m.group(2):
+                classes.add(m.group(2))
+            elif m.group(3):
+                id_ = m.group(3)
+            else:
+                attrs.append((m.group(4), m.group(5)))
+            pos = m.end()
+
+        return tag, classes, id_, attrs
+
+    @staticmethod
+    def _match_one(el, compound) -> bool:
+        tag, classes, id_, attrs = compound
+        if tag is not None and el.tag != tag:
+            return False
+        if classes and not classes <= set(el.get('class', '').split()):
+            return False
+        if id_ is not None and el.get('id') != id_:
+            return False
+
+        return all(el.get(k) is not None and (v is None or el.get(k) == v) for k, v in attrs)
+
+    def matches(self, el) -> bool:
+        if not self._match_one(el, self.compounds[-1]):
+            return False
+
+        el = el.getparent()
+        for compound in reversed(self.compounds[:-1]):
+            while el is not None and not self._match_one(el, compound):
+                el = el.getparent()
+            if el is None:
+                return False
+            el = el.getparent()
+
+        return True
+
+
+class Target:
+    """ What to pull out of the elements matching `selector`
+
+    The value is attribute `attr`, or the element's text (`own_text` for only the text before its
+    first child, otherwise all of it, like BeautifulSoup's .text). With `limit` 1 the result is the
+    first value or None, otherwise a list of up to `limit` values (None for no limit). """
+    __slots__ = ('selector', 'attr', 'own_text', 'limit')
+
+    def __init__(self, selector: str, attr: str = None, own_text: bool = False, limit: int = 1):
+        self.selector = Selector(selector)
+        self.attr = attr
+        self.own_text = own_text
+        self.limit = limit
+
+    def value(self, el):
+        if self.attr is not None:
+            return el.get(self.attr)
+        if self.own_text:
+            return el.text or ''
+
+        return ''.join(el.itertext())
+
+
+class Extractor:
+    """ Pulls targets out of an HTML document while it's still arriving
+
+    Chunks are fed to lxml's incremental parser and every element is checked against the targets
+    as soon as it's complete (attribute targets as soon as it opens), so feed() can say when every
+    target has been found and the rest of the document needn't be read at all. `targets` maps
+    result names to a Target or just a selector string (the first match's text). """
+
+    def __init__(self, targets: dict):
+        self.targets = {name: Target(t) if isinstance(t, str) else t for name, t in targets.items()}
+        self.found = {name: [] for name in self.targets}
+        self.pending = set(self.targets)
+        self.bytes_read = 0
+        # Seconds spent parsing, which is spread over the download
+        self.parse_time = 0.0
+        self.decoder = None
+        self.parser = etree.HTMLPullParser(events=('start', 'end'))
+
+    @property
+    def done(self) -> bool:
+        return not self.pending
+
+    def start(self, charset: str = None):
+        """ Sets the charset the bytes are in, returns feed """
+        self.decoder = codecs.getincrementaldecoder(charset or 'utf-8')(errors='replace')
+        return self.feed
+
+    def feed(self, chunk: bytes) -> bool:
+        """ Parses another chunk, returns True once every target has been found """
+        if self.decoder is None:
+            self.start()
+
+        start = time.perf_counter()
+        self.bytes_read += len(chunk)
+        self.parser.feed(self.decoder.decode(chunk))
+        self._handle_events()
+        self.parse_time += time.perf_counter() - start
+
+        return self.done
+
+    def _handle_events(self):
+        for event, el in self.parser.read_events():
+            if not isinstance(el.tag, str):
+                continue
+
+            for name in tuple(self.pending):
+                target = self.targets[name]
+                # Attributes are there from the start, text only once the element has ended
+                if (event == 'start') != (target.attr is not None) or not target.selector.matches(el):
+                    continue
+
+                values = self.found[name]
+                values.append(target.value(el))
+                if target.limit is not None and len(values) >= target.limit:
+                    self.pending.discard(name)
+
+            if self.done:
+                return
+
+            # Nothing left needs the text of finished elements, drop it to keep the tree small
+            if event == 'end' and all(self.targets[name].attr is not None for name in self.pending):
+                el.clear(keep_tail=True)
+
+    def results(self) -> dict:
+        """ Finishes parsing (if it didn't stop early) and returns what was found """
+        if not self.done:
+            start = time.perf_counter()
+            if self.decoder is not None:
+                self.parser.feed(self.decoder.decode(b'', final=True))
+            try:
+                self.parser.close()
+            except etree.XMLSyntaxError:
+                # Nothing was fed at all
+                pass
+            self._handle_events()
+            self.parse_time += time.perf_counter() - start
+
+        return {name: (values[0] if values else None) if self.targets[name].limit == 1 else values
+                for name, values in self.found.items()}
+
+
+def extract(html: str, targets: dict) -> dict:
+    """ Extracts targets from a whole document already in memory """
+    extractor = Extractor(targets)
+    extractor.parser.feed(html)
+    extractor._handle_events()
+
+    return extractor.results()
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+import aiohttp
+from yarl import URL
+
+from utils import deadline
+from utils import metrics
+from utils.circuit_breaker import CircuitBreaker
+from utils.html_stream import Extractor
+from utils.ratelimit import HOST_LIMITS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Hard limits for any single request, nothing a command does should take longer than this
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=15, connect=5)
+# Responses bigger than this are abandoned rather than read into memory
+MAX_RESPONSE_SIZE = 5 * 1024 * 1024
+
+# Returned by the get_* helpers for a 304, only ever when the request was conditional
+NOT_MODIFIED = object()
+# The Validators GETs record into and revalidate with, set by the cache while it loads a value
+revalidate = ContextVar('revalidate', default=None)
+
+
+def loads(data):
+    """ Decodes JSON from bytes or str, with orjson when it's installed """
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+class Validators:
+    """ The ETag / Last-Modified of the responses one value was built from, by URL
+
+    A GET made with these sends back the validators `previous` holds for its URL, so a 304 means
+    that value is still current. `current` collects what this round of GETs got: every 200's
+    validators, and the previous ones of every 304. Only whoever holds the value they describe
+    should keep them (e.g. the cache stores them in the value's entry). """
+    __slots__ = ('previous', 'current')
+
+    def __init__(self, previous: dict = None):
+        self.previous = previous or {}
+        self.current = {}
+
+    def lookup(self, key: str):
+        return self.current.get(key) or self.previous.get(key)
+
+    def record(self, key: str, headers):
+        validators = {}
+        if 'ETag' in headers:
+            validators['If-None-Match'] = headers['ETag']
+        if 'Last-Modified' in headers:
+            validators['If-Modified-Since'] = headers['Last-Modified']
+
+        if validators:
+            self.current[key] = validators
+        else:
+            self.current.pop(key, None)
+
+    def not_modified(self, key: str):
+        self.current[key] = self.lookup(key)
+
+
+class Response:
+    """ A fully read response, so nothing holds on to a connection after the request is done """
+    __slots__ = ('status', 'headers', 'url', 'body', 'charset')
+
+    def __init__(self, status: int, headers, url: str, body: bytes, charset: str = None):
+        self.status = status
+        self.headers = headers
+        self.url = url
+        self.body = body
+        self.charset = charset
+
+    def text(self) -> str:
+        return self.body.decode(self.charset or 'utf-8', errors='replace')
+
+    def json(self):
+        """ Decodes the body as JSON whatever the content type claims it is """
+        return loads(self.body)
+
+
+class HTTPClient:
+    """ The HTTP client every cog shares
+
+    All requests go through one pooled connector, so connections (and their TLS sessions) to an
+    upstream are kept alive and reused, DNS lookups are cached, and no one host can take every
+    connection. Every request has a timeout and a response size cap.
+
+    The get_* helpers return None on anything but a 200 -- including timeouts and connection
+    errors -- so a cog only has to handle one failure case. The exception is a host whose circuit
+    breaker is open (it's been failing), where requests raise UpstreamUnavailable straight away
+    instead of waiting on it again. Requests to hosts with a quota (see utils.ratelimit.HOST_LIMITS)
+    wait for a token from `ratelimiter`, and raise RateLimited if that would take too long.
+
+    Inside a command, a request never outlives the command's deadline (see utils.deadline): it
+    times out early and raises DeadlineExceeded.
+
+    GETs record the ETag / Last-Modified of a 200 into a Validators -- the one passed as
+    `validators`, or else the current `revalidate` -- and send back the ones it already holds for
+    the URL, unless `conditional=False`. A 304 then returns NOT_MODIFIED instead of downloading the
+    body again.
+
+    extract() parses an HTML page while it downloads and hangs up as soon as everything it was
+    asked for has been found, for scrapers which only need a few elements near the top of a page. """
+
+    def __init__(self, loop, *, limit: int = 100, limit_per_host: int = 10, dns_ttl: int = 300,
+                 keepalive: float = 30, timeout: aiohttp.ClientTimeout = DEFAULT_TIMEOUT,
+                 max_size: int = MAX_RESPONSE_SIZE, breaker_options: dict = None, ratelimiter=None):
+        self.max_size = max_size
+        self.ratelimiter = ratelimiter
+        self.timeout = timeout
+        # Per host, see CircuitBreaker for the options
+        self.breakers = {}
+        self.breaker_options = breaker_options or {}
+        self.stats = Counter()
+        self.connector = aiohttp.TCPConnector(loop=loop, limit=limit, limit_per_host=limit_per_host,
+                                              ttl_dns_cache=dns_ttl, keepalive_timeout=keepalive)
+        # Exposed for libraries which want a ClientSession of their own (e.g. asyncurban)
+        self.session = aiohttp.ClientSession(loop=loop, connector=self.connector, timeout=timeout,
+                                             trace_configs=[metrics.http_trace_config()])
+
+    @classmethod
+    def from_config(cls, loop, config: dict, ratelimiter=None):
+        """ Builds a client from the optional `http` section of the config file """
+        options = config.get('http', {})
+        timeout = aiohttp.ClientTimeout(total=options.get('timeout', DEFAULT_TIMEOUT.total),
+                                        connect=options.get('connect_timeout', DEFAULT_TIMEOUT.connect))
+
+        return cls(loop, limit=options.get('limit', 100), limit_per_host=options.get('limit_per_host', 10),
+                   dns_ttl=options.get('dns_ttl', 300), keepalive=options.get('keepalive', 30),
+                   timeout=timeout, max_size=options.get('max_size', MAX_RESPONSE_SIZE),
+                   breaker_options=options.get('circuit_breaker'), ratelimiter=ratelimiter)
+
+    async def _read(self, r: aiohttp.ClientResponse, consume=None) -> bytes:
+        """ Reads the whole body -- or with `consume`, hands a 200's body to it instead
+
+        consume(charset) returns a function taking each chunk as it arrives, which returns True
+        once it doesn't need any more. The connection is closed rather than reused then. """
+        if r.content_length is not None and r.content_length > self.max_size:
+            raise ResponseTooLarge(f'{r.url.host} sent {r.content_length} bytes')
+
+        if consume is not None and r.status == 200:
+            feed = consume(r.charset)
+            size = 0
+            async for chunk in r.content.iter_any():
+                size += len(chunk)
+                if size > self.max_size:
+                    raise ResponseTooLarge(f'{r.url.host} sent more than {self.max_size} bytes')
+                if feed(chunk):
+                    self.stats['stopped_early'] += 1
+                    r.close()
+                    break
+
+            self.stats['streamed_bytes'] += size
+            return b''
+
+        body = bytearray()
+        async for chunk in r.content.iter_chunked(64 * 1024):
+            body.extend(chunk)
+            if len(body) > self.max_size:
+                raise ResponseTooLarge(f'{r.url.host} sent more than {self.max_size} bytes')
+
+        return bytes(body)
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(host, **self.breaker_options)
+
+        return self.breakers[host]
+
+    async def request(self, method: str, url: str, consume=None, **kwargs):
+        """ Makes a request and reads the body (see _read for `consume`), returns a Response or None if it failed
+
+        Raises UpstreamUnavailable if the host's circuit is open, RateLimited if its quota is used up
+        and DeadlineExceeded if the command's deadline passes. """
+        host = URL(url).host
+        breaker = self.breaker(host)
+        breaker.check()
+        if self.ratelimiter is not None and host in HOST_LIMITS:
+            await self.ratelimiter.acquire(HOST_LIMITS[host])
+
+        left = deadline.remaining()
+        if left is not None and 'timeout' not in kwargs:
+            deadline.check(host)
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=min(left, self.timeout.total),
+                                                      connect=self.timeout.connect)
+
+        start = time.perf_counter()
+        try:
+            async with self.session.request(method, url, **kwargs) as r:
+                resp = Response(r.status, r.headers, str(r.url), await self._read(r, consume), r.charset)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            elapsed = time.perf_counter() - start
+            if isinstance(e, asyncio.TimeoutError) and deadline.expired():
+                # Only the upstream's fault if it was slow by its own standards
+                if elapsed >= breaker.slow_call:
+                    breaker.record(False, elapsed)
+                raise deadline.DeadlineExceeded(host) from None
+
+            breaker.record(False, elapsed)
+            print(f'{method} {url} failed: {type(e).__name__} {e}')
+            return None
+        except ResponseTooLarge as e:
+            # Not the upstream being unhealthy
+            breaker.record(True, time.perf_counter() - start)
+            print(f'{method} {url} failed: {e}')
+            return None
+
+        breaker.record(resp.status < 500 and resp.status != 429, time.perf_counter() - start)
+        return resp
+
+    async def get(self, url: str, headers: dict = None, params: dict = None, conditional: bool = True,
+                  validators: Validators = None, **kwargs):
+        """ A GET which returns the Response only if it was a 200, or NOT_MODIFIED for a conditional 304 """
+        if validators is None:
+            validators = revalidate.get()
+        vkey = str(URL(url).update_query(params)) if params else url
+        sent = validators.lookup(vkey) if validators is not None and conditional else None
+        if sent:
+            headers = {**(headers or {}), **sent}
+
+        resp = await self.request('GET', url, headers=headers, params=params, **kwargs)
+        if resp is None:
+            return None
+
+        if sent and resp.status == 304:
+            self.stats['not_modified'] += 1
+            validators.not_modified(vkey)
+            return NOT_MODIFIED
+
+        if resp.status != 200:
+            return None
+
+        if validators is not None:
+            validators.record(vkey, resp.headers)
+        return resp
+
+    async def get_text(self, url: str, headers: dict = None, params: dict = None, **kwargs):
+        resp = await self.get(url, headers=headers, params=params, **kwargs)
+        if resp is None or resp is NOT_MODIFIED:
+            return resp
+
+        return resp.text()
+
+    async def get_json(self, url: str, headers: dict = None, params: dict = None, **kwargs):
+        resp = await self.get(url, headers=headers, params=params, **kwargs)
+        if resp is None or resp is NOT_MODIFIED:
+            return resp
+
+        try:
+            return resp.json()
+        except ValueError:
+            print(f'GET {url} returned invalid JSON')
+            return None
+
+    async def extract(self, url: str, targets: dict, headers: dict = None, params: dict = None, **kwargs):
+        """ GETs an HTML page and returns the targets found in it (see html_stream.Extractor)
+
+        Stops downloading once every target has been found. Like get_text, returns None if the
+        request failed and may return NOT_MODIFIED. """
+        extractor = Extractor(targets)
+        resp = await self.get(url, headers=headers, params=params, consume=extractor.start, **kwargs)
+        if resp is None or resp is NOT_MODIFIED:
+            return resp
+
+        results = extractor.results()
+        metrics.registry.observe('parse', URL(url).host, extractor.parse_time)
+        return results
+
+    async def post_text(self, url: str, data=None, **kwargs):
+        resp = await self.request('POST', url, data=data, **kwargs)
+        if resp is None or resp.status != 200:
+            return None
+
+        return resp.text()
+
+    async def close(self):
+        await self.session.close()
@@ -0,0 +1,52 @@
+import json
+import os
+import struct
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Every message is a JSON object prefixed with its length
+HEADER = struct.Struct('>I')
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+def socket_path(directory: str, worker_id: int) -> str:
+    """ Where cog worker `worker_id` listens """
+    return os.path.join(directory, f'qtbot-cogs-{worker_id}.sock')
+
+
+def dumps(message: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(message)
+
+    return json.dumps(message, separators=(',', ':')).encode()
+
+
+def loads(data: bytes) -> dict:
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+async def read_message(reader) -> dict:
+    """ Reads one message, raises asyncio.IncompleteReadError once the other side has gone """
+    size, = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if size > MAX_MESSAGE_SIZE:
+        raise ValueError(f'IPC message of {size} bytes is too big')
+
+    return loads(await reader.readexactly(size))
+
+
+def write_message(writer, message: dict):
+    """ Queues one message, the writer's transport buffers it so there's nothing to await """
+    data = dumps(message)
+    writer.write(HEADER.pack(len(data)) + data)
+
+
+def user_payload(user) -> dict:
+    """ The parts of a discord.User / Member a command can use """
+    return {'id': user.id, 'name': user.name, 'discriminator': user.discriminator,
+            'display_name': user.display_name, 'bot': user.bot, 'avatar_url': str(user.avatar_url)}
@@ -0,0 +1,95 @@
+import gc
+import inspect
+import sys
+import tracemalloc
+import types
+
+from discord.ext import commands
+
+# Never walked into -- they're shared by everything or aren't data
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+           types.CodeType, types.FrameType, commands.Command)
+
+
+def start_tracing(frames: int = 25):
+    """ Starts tracemalloc. Needs doing as early as possible, only later allocations are traced """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def deep_sizeof(obj, seen: set, stop: set) -> int:
+    """ The size of `obj` plus everything reachable from it, skipping ids in `seen` and `stop`
+
+    `seen` is updated, so sharing it between calls counts shared structures only once. """
+    total = 0
+    pending = [obj]
+    while pending:
+        o = pending.pop()
+        if id(o) in seen or id(o) in stop or isinstance(o, _OPAQUE):
+            continue
+
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        pending.extend(gc.get_referents(o))
+
+    return total
+
+
+def data_attributes(cog) -> dict:
+    """ A cog's instance attributes plus the plain data defined on its class """
+    attrs = {}
+    for name, value in vars(type(cog)).items():
+        if name.startswith('__') or callable(value) or inspect.isdatadescriptor(value):
+            continue
+        attrs[name] = value
+
+    attrs.update({k: v for k, v in vars(cog).items() if not k.startswith('__')})
+
+    return attrs
+
+
+def account(bot) -> dict:
+    """ Returns {cog name: {attribute: retained bytes}} for every loaded cog
+
+    The bot and everything hanging directly off it (sessions, pools, the redis client...) is shared,
+    so it's excluded -- otherwise every cog holding `self.bot` would be charged for the whole process. """
+    stop = {id(bot)} | {id(v) for v in vars(bot).values()}
+    usage = {}
+    for name, cog in bot.cogs.items():
+        seen = set()
+        usage[name] = {attr: deep_sizeof(value, seen, stop) for attr, value in data_attributes(cog).items()}
+
+    return usage
+
+
+def traced_by_cog(bot, snapshot: tracemalloc.Snapshot) -> dict:
+    """ Returns {cog name: bytes still allocated from inside that cog's module} from a tracemalloc snapshot """
+    traced = {}
+    for name, cog in bot.cogs.items():
+        filename = inspect.getfile(type(cog))
+        stats = snapshot.filter_traces([tracemalloc.Filter(True, filename, all_frames=True)]).statistics('filename')
+        traced[name] = sum(x.size for x in stats)
+
+    return traced
+
+
+class MemorySnapshot:
+    """ Per-cog memory accounting at one point in time """
+
+    def __init__(self, bot):
+        self.usage = account(bot)
+        self.traced = None
+        if tracemalloc.is_tracing():
+            self.traced = traced_by_cog(bot, tracemalloc.take_snapshot())
+
+    def total(self, cog: str) -> int:
+        return sum(self.usage.get(cog, {}).values())
+
+
+def fmt_bytes(n: int) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if abs(n) < 1024:
+            return f'{n:.0f}{unit}' if unit == 'B' else f'{n:.1f}{unit}'
+        n /= 1024
+
+    return f'{n:.1f}GB'
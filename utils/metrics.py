@@ -0,0 +1,200 @@
+import re
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+import aiohttp
+import aredis
+from aiohttp import web
+
+from utils import tracing
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Pulls the table out of a query so postgres timings read like "SELECT user_info"
+_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+(\w+)', re.IGNORECASE)
+
+
+class Histogram:
+    """ A fixed-bucket latency histogram (cumulative on render, like Prometheus expects) """
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float:
+        """ Estimates a quantile by interpolating inside the bucket it falls in """
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for idx, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                # Anything past the last bucket can only be reported as the last bound
+                if idx == len(BUCKETS):
+                    return BUCKETS[-1]
+
+                lower = BUCKETS[idx - 1] if idx else 0.0
+                return lower + (BUCKETS[idx] - lower) * ((rank - seen) / n)
+            seen += n
+
+        return BUCKETS[-1]
+
+
+class Metrics:
+    """ Latency histograms keyed by (kind, name)
+
+    kind is one of 'command', 'http', 'postgres', 'redis', 'discord' or 'parse' and name is the
+    command's qualified name or the upstream (host / query / redis command / parser). """
+
+    def __init__(self):
+        self.histograms = {}
+        self.collectors = []
+
+    def observe(self, kind: str, name: str, seconds: float):
+        try:
+            hist = self.histograms[kind, name]
+        except KeyError:
+            hist = self.histograms[kind, name] = Histogram()
+
+        hist.observe(seconds)
+
+    @contextmanager
+    def timer(self, kind: str, name: str):
+        """ Times the block into a histogram and, inside a command, records it as a trace span """
+        start = time.perf_counter()
+        span = tracing.start_span(kind, name)
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.observe(kind, name, time.perf_counter() - start)
+            tracing.end_span(span, error)
+
+    def add_collector(self, func):
+        """ Registers a function returning extra (metric, labels dict, value) samples to expose """
+        self.collectors.append(func)
+
+    def slowest(self, kind: str = 'command', q: float = 0.95, limit: int = 10) -> list:
+        """ Returns [(name, histogram)] for `kind`, slowest first by quantile `q` """
+        hists = [(name, hist) for (k, name), hist in self.histograms.items() if k == kind]
+        hists.sort(key=lambda x: x[1].quantile(q), reverse=True)
+
+        return hists[:limit]
+
+    @staticmethod
+    def _labels(labels: dict) -> str:
+        escaped = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                           for k, v in labels.items())
+        return f'{{{escaped}}}'
+
+    def render_prometheus(self) -> str:
+        """ Renders everything in the Prometheus text exposition format """
+        lines = []
+        for kind in sorted({k for k, _ in self.histograms}):
+            metric = f'qtbot_{kind}_seconds'
+            lines.append(f'# TYPE {metric} histogram')
+            for (k, name), hist in sorted(self.histograms.items()):
+                if k != kind:
+                    continue
+
+                cumulative = 0
+                for bound, n in zip(BUCKETS + ('+Inf',), hist.counts):
+                    cumulative += n
+                    lines.append(f'{metric}_bucket{self._labels({"name": name, "le": bound})} {cumulative}')
+                lines.append(f'{metric}_sum{self._labels({"name": name})} {hist.sum}')
+                lines.append(f'{metric}_count{self._labels({"name": name})} {hist.count}')
+
+        for collector in self.collectors:
+            for metric, labels, value in collector():
+                lines.append(f'{metric}{self._labels(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 9100) -> web.AppRunner:
+        """ Serves /metrics over HTTP for Prometheus to scrape """
+        async def handler(request):
+            return web.Response(text=self.render_prometheus(), content_type='text/plain')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+
+        return runner
+
+
+# The process-wide registry
+registry = Metrics()
+
+
+def http_trace_config(metrics: Metrics = registry) -> aiohttp.TraceConfig:
+    """ Times every request made through a ClientSession, keyed by host """
+    async def on_request_start(session, trace_ctx, params):
+        trace_ctx.start = time.perf_counter()
+        trace_ctx.span = tracing.start_span('http', f'{params.method} {params.url.host}{params.url.path}')
+
+    async def on_request_end(session, trace_ctx, params):
+        metrics.observe('http', params.url.host, time.perf_counter() - trace_ctx.start)
+        tracing.end_span(trace_ctx.span, getattr(params, 'exception', None))
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_end)
+
+    return trace_config
+
+
+class InstrumentedRedis(aredis.StrictRedis):
+    """ A StrictRedis which times every command it sends """
+
+    async def execute_command(self, *args, **options):
+        with registry.timer('redis', str(args[0]).upper()):
+            return await super().execute_command(*args, **options)
+
+
+class TimedPool:
+    """ Wraps an asyncpg pool so that every query is timed """
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    @staticmethod
+    def query_name(query: str) -> str:
+        verb = query.split(None, 1)[0].upper() if query.strip() else '?'
+        table = _TABLE_RE.search(query)
+
+        return f'{verb} {table.group(1)}' if table else verb
+
+    async def _timed(self, method, query: str, *args, **kwargs):
+        with registry.timer('postgres', self.query_name(query)):
+            return await method(query, *args, **kwargs)
+
+    async def execute(self, query: str, *args, **kwargs):
+        return await self._timed(self._pool.execute, query, *args, **kwargs)
+
+    async def fetch(self, query: str, *args, **kwargs):
+        return await self._timed(self._pool.fetch, query, *args, **kwargs)
+
+    async def fetchrow(self, query: str, *args, **kwargs):
+        return await self._timed(self._pool.fetchrow, query, *args, **kwargs)
+
+    async def fetchval(self, query: str, *args, **kwargs):
+        return await self._timed(self._pool.fetchval, query, *args, **kwargs)
@@ -0,0 +1,39 @@
+from collections import Counter
+
+
+class MessagePrefilter:
+    """ Decides whether a message could possibly be a command before any Context is built
+
+    Almost every message the bot sees is normal chat, so this is the hottest path in the process.
+    Each guild's prefixes are kept as a ready-made tuple in :class:`utils.guild_settings.GuildSettings`
+    which `str.startswith` checks in one pass.
+
+    Attributes
+    ----------
+    stats : Counter
+        Counts of 'dispatched', 'skipped_bot' and 'skipped_prefix' messages.
+    """
+
+    def __init__(self, guild_settings):
+        self.guild_settings = guild_settings
+        self.stats = Counter()
+
+    async def check(self, message) -> bool:
+        """ Returns True if the message should be turned into a Context and invoked """
+        if message.author.bot:
+            self.stats['skipped_bot'] += 1
+            return False
+
+        guild = message.guild
+        if guild is None:
+            prefixes = self.guild_settings.default_prefixes
+        else:
+            # Only a guild's first message (or one after an invalidation) has to wait on the database
+            prefixes = self.guild_settings.cached_prefixes(guild.id) or await self.guild_settings.prefixes(guild.id)
+
+        if not message.content.startswith(prefixes):
+            self.stats['skipped_prefix'] += 1
+            return False
+
+        self.stats['dispatched'] += 1
+        return True
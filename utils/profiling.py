@@ -0,0 +1,132 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def _is_loop_machinery(filename: str) -> bool:
+    """ Event loop internals sit at the bottom of every stack, so they only clutter a report """
+    return f'{os.sep}asyncio{os.sep}' in filename or filename == '~'
+
+
+def _short(filename: str) -> str:
+    """ Trims a path down to something readable in a Discord message """
+    cwd = os.getcwd()
+    if filename.startswith(cwd):
+        return os.path.relpath(filename, cwd)
+
+    for marker in ('site-packages', 'lib/python'):
+        if marker in filename:
+            return filename.split(marker, 1)[1].lstrip('/\\').split('/', 1)[-1]
+
+    return filename
+
+
+class SamplingProfiler(threading.Thread):
+    """ A low-overhead profiler which samples one thread's stack every `interval` seconds
+
+    Nothing is hooked into the profiled code, so it costs next to nothing while it runs.
+    A function's cumulative count is the number of samples it appeared anywhere in, and
+    its self count the number of samples it was the innermost frame of. """
+
+    def __init__(self, thread_id: int, interval: float = 0.002):
+        super().__init__(name='sampling-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.idle = 0
+        self.cumulative = Counter()
+        self.own = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            # The loop waiting on its selector means nothing was running
+            if frame.f_code.co_filename.endswith('selectors.py'):
+                self.idle += 1
+                continue
+
+            self.samples += 1
+            self.own[(frame.f_code.co_filename, frame.f_code.co_firstlineno, frame.f_code.co_name)] += 1
+
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                seen.add((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            self.cumulative.update(seen)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def report(self, limit: int = 15) -> str:
+        if not self.samples:
+            return 'No samples taken -- the command finished too quickly.'
+
+        lines = [f'{self.samples} busy / {self.idle} idle samples every {self.interval * 1000:.0f}ms',
+                 f'{"cum%":>6} {"self%":>6}  function']
+        rows = [x for x in self.cumulative.most_common() if not _is_loop_machinery(x[0][0])]
+        for key, n in rows[:limit]:
+            filename, lineno, name = key
+            lines.append(f'{n / self.samples:>6.1%} {self.own[key] / self.samples:>6.1%}  '
+                         f'{_short(filename)}:{lineno}({name})')
+
+        return '\n'.join(lines)
+
+
+def cprofile_report(profiler: cProfile.Profile, limit: int = 15) -> str:
+    """ Formats a finished cProfile run as the top `limit` functions by cumulative time """
+    stats = pstats.Stats(profiler)
+    rows = sorted([x for x in stats.stats.items() if not _is_loop_machinery(x[0][0])],
+                  key=lambda x: x[1][3], reverse=True)[:limit]
+
+    lines = [f'{stats.total_calls} calls in {stats.total_tt * 1000:.1f}ms',
+             f'{"cum ms":>8} {"own ms":>8} {"calls":>7}  function']
+    for (filename, lineno, name), (cc, nc, tt, ct, callers) in rows:
+        lines.append(f'{ct * 1000:>8.1f} {tt * 1000:>8.1f} {nc:>7}  {_short(filename)}:{lineno}({name})')
+
+    return '\n'.join(lines)
+
+
+class profile:
+    """ Profiles whatever runs on the current thread inside the block
+
+    mode is 'cprofile' (deterministic, slows the code down) or 'sample' (statistical, cheap).
+    On the event loop thread that includes other commands running at the same time. """
+
+    def __init__(self, mode: str = 'cprofile'):
+        self.mode = mode
+        self.elapsed = 0.0
+        self._profiler = None
+
+    def __enter__(self):
+        if self.mode == 'sample':
+            self._profiler = SamplingProfiler(threading.get_ident())
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        if self.mode == 'sample':
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def report(self, limit: int = 15) -> str:
+        if self.mode == 'sample':
+            return self._profiler.report(limit)
+
+        return cprofile_report(self._profiler, limit)
@@ -0,0 +1,154 @@
+import asyncio
+import time
+from collections import Counter
+
+from utils import deadline
+from utils.metrics import registry
+
+# name: (calls, per seconds, burst) -- the documented quotas, or a conservative guess where there's none.
+# Can be overridden with `rate_limits` in the config file.
+DEFAULT_LIMITS = {
+    'riot': (100, 120, 20),
+    'champion.gg': (50, 10, 10),
+    'whatismymmr': (60, 60, 10),
+    # A search costs 100 of the 10,000 daily quota units
+    'youtube': (100, 24 * 60 * 60, 10),
+    'igdb': (4, 1, 4),
+    'lastfm': (5, 1, 5),
+    'newsapi': (500, 24 * 60 * 60, 10),
+    'giphy': (40, 60 * 60, 10),
+}
+
+# Which limit an HTTPClient request falls under, by host. Riot and YouTube go through sync libraries
+# in an executor instead, so those cogs acquire their limits themselves.
+HOST_LIMITS = {
+    'api.champion.gg': 'champion.gg',
+    'na.whatismymmr.com': 'whatismymmr',
+    'api-2445582011268.apicast.io': 'igdb',
+    'ws.audioscrobbler.com': 'lastfm',
+    'newsapi.org': 'newsapi',
+    'api.giphy.com': 'giphy',
+}
+
+# Refills a bucket and takes a token if there is one. Returns 0, or how many ms until there will be one.
+# KEYS[1] bucket, ARGV rate (tokens / ms), capacity, now (ms)
+TAKE_TOKEN = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+
+local bucket = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) / rate)
+end
+
+redis.call('hmset', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('pexpire', KEYS[1], math.ceil(capacity / rate) + 1000)
+return wait
+"""
+
+
+class RateLimited(Exception):
+    """ Raised when a call would have to wait longer for its rate limit than the caller wants to """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f'{name} is rate limited, retry in {retry_after:.1f}s')
+        self.name = name
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """ `capacity` tokens, refilled at `rate` tokens per second """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """ Takes a token, returns 0 -- or how many seconds until there will be one """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        return (1 - self.tokens) / self.rate
+
+    def give_back(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class RateLimiter:
+    """ Token bucket rate limits per upstream, shared by every process through redis
+
+    Each process has a local bucket with the full limit, which saves asking redis when this process
+    alone has used the quota up, and a global bucket in redis which is the real limit. If redis
+    can't be reached the local bucket is all there is. """
+
+    def __init__(self, redis, limits: dict = None):
+        self.redis = redis
+        self.limits = {**DEFAULT_LIMITS, **{k: tuple(v) for k, v in (limits or {}).items()}}
+        self.buckets = {name: TokenBucket(calls / per, burst) for name, (calls, per, burst) in self.limits.items()}
+        # Quota usage per limit: acquired, waited, rejected
+        self.usage = Counter()
+
+    async def _take_global(self, name: str) -> float:
+        calls, per, burst = self.limits[name]
+        try:
+            wait = await self.redis.eval(TAKE_TOKEN, 1, f'ratelimit:{name}', calls / per / 1000, burst,
+                                         int(time.time() * 1000))
+        except Exception as e:
+            print(f'Global rate limit for {name} unavailable, using the local one: {type(e).__name__} {e}')
+            return 0.0
+
+        return int(wait) / 1000
+
+    async def acquire(self, name: str, wait: bool = True, max_wait: float = 10):
+        """ Takes a token for `name`, sleeping until there is one
+
+        With wait=False, or if there won't be a token within `max_wait` seconds, raises RateLimited
+        straight away instead -- as it does if the token would come after the command's deadline.
+        Names without a limit are always let through. """
+        if name not in self.limits:
+            return
+
+        left = deadline.remaining()
+        if left is not None:
+            max_wait = min(max_wait, left)
+
+        bucket = self.buckets[name]
+        start = time.perf_counter()
+        waited = False
+        while True:
+            delay = bucket.take()
+            if not delay:
+                delay = await self._take_global(name)
+                if delay:
+                    bucket.give_back()
+
+            if not delay:
+                break
+
+            if not wait or time.perf_counter() - start + delay > max_wait:
+                self.usage[(name, 'rejected')] += 1
+                raise RateLimited(name, delay)
+
+            waited = True
+            await asyncio.sleep(delay)
+
+        self.usage[(name, 'acquired')] += 1
+        if waited:
+            self.usage[(name, 'waited')] += 1
+            registry.observe('ratelimit', name, time.perf_counter() - start)
@@ -0,0 +1,249 @@
+import asyncio
+import itertools
+import time
+from collections import Counter
+
+import discord
+
+from utils import cog_manifest
+from utils import ipc
+from utils.metrics import registry
+
+# Seconds between attempts to (re)connect to a cog worker
+RECONNECT_DELAY = 1
+# How long a worker gets to answer a stats request
+STATS_TIMEOUT = 2
+# Seconds past the longest command deadline before asking a worker whether it's still running a
+# command -- paginators keep going long after their deadline
+INVOCATION_GRACE = 30
+
+
+def _embed(data):
+    return discord.Embed.from_dict(data) if data is not None else None
+
+
+class RemoteInvocation:
+    """ A command running in a cog worker, and the messages it has sent so far """
+
+    def __init__(self, id_: int, ctx, worker):
+        self.id = id_
+        self.ctx = ctx
+        self.worker = worker
+        self.messages = {}
+        self.done = asyncio.get_event_loop().create_future()
+
+    def finish(self, result: dict):
+        if not self.done.done():
+            self.done.set_result(result)
+
+
+class WorkerConnection:
+    """ The connection to one cog worker, reconnecting whenever it's lost (e.g. the worker restarted) """
+
+    def __init__(self, remote, worker_id: int, path: str):
+        self.remote = remote
+        self.worker_id = worker_id
+        self.path = path
+        self.writer = None
+        # Invocation id -> RemoteInvocation
+        self.inflight = {}
+        self.stats = Counter()
+        self._stats_reply = None
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None
+
+    def send(self, message: dict):
+        ipc.write_message(self.writer, message)
+
+    async def maintain(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+
+            self.writer = writer
+            print(f'Connected to cog worker {self.worker_id}')
+            try:
+                while True:
+                    self.remote.handle(self, await ipc.read_message(reader))
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                print(f'Lost cog worker {self.worker_id}: {type(e).__name__}')
+            finally:
+                self.writer = None
+                writer.close()
+                for invocation in list(self.inflight.values()):
+                    invocation.finish({'lost': True})
+
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def request_stats(self):
+        """ The worker's own report of its load, None if it's not there or doesn't answer """
+        if not self.connected:
+            return None
+
+        if self._stats_reply is None or self._stats_reply.done():
+            self._stats_reply = asyncio.get_event_loop().create_future()
+            self.send({'op': 'stats'})
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(self._stats_reply), STATS_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+
+
+class RemoteCogs:
+    """ Runs the commands of `cogs` in cog worker processes (see cog_worker.py)
+
+    The gateway process doesn't load those cogs. When one of their commands is invoked, the
+    message is forwarded to the least busy connected worker, which parses and runs the command
+    and hands every reply back to be sent -- embeds as dicts. The messages it sent can be edited
+    and reacted to in the same way, and reactions to them are passed on to the worker so
+    paginated commands keep working. Every gateway connects to each worker socket in `paths` --
+    the set of workers is fixed when it starts -- and reconnects to a worker which restarts. """
+
+    def __init__(self, bot, cogs: list, paths: list):
+        self.bot = bot
+        # The workers never load the bot's do_not_load cogs either
+        self.cogs = {cog for cog in cogs if cog not in bot.do_not_load}
+        self.manifest = {name: extension for name, extension in cog_manifest.build_manifest().items()
+                         if extension.split('.')[-1] in self.cogs}
+        self.workers = [WorkerConnection(self, worker_id, path) for worker_id, path in enumerate(paths)]
+        self.ids = itertools.count()
+        # Message id -> the RemoteInvocation which sent it, so reactions get to the right worker
+        self.by_message = {}
+
+    def start(self):
+        for worker in self.workers:
+            self.bot.loop.create_task(worker.maintain())
+        self.bot.add_listener(self.on_reaction_add)
+
+    def handles(self, invoked_with: str) -> bool:
+        return invoked_with.lower() in self.manifest
+
+    def pick(self):
+        """ The connected worker with the fewest commands in flight """
+        return min((w for w in self.workers if w.connected), key=lambda w: len(w.inflight), default=None)
+
+    async def forward(self, ctx):
+        """ Runs the command in a worker, returns its qualified name or None if it never ran """
+        worker = self.pick()
+        if worker is None:
+            await ctx.error('Error', description='That command is unavailable right now, please try again in a bit.')
+            return None
+
+        # Workers check is_owner against this, they can't ask Discord themselves
+        if self.bot.owner_id is None:
+            await self.bot.is_owner(ctx.author)
+
+        invocation = RemoteInvocation(next(self.ids), ctx, worker)
+        worker.inflight[invocation.id] = invocation
+        start = time.perf_counter()
+        try:
+            worker.send({'op': 'invoke', 'id': invocation.id, 'content': ctx.message.content, 'prefix': ctx.prefix,
+                         'message_id': ctx.message.id, 'author': ipc.user_payload(ctx.author),
+                         'channel_id': ctx.channel.id,
+                         'guild': {'id': ctx.guild.id, 'name': ctx.guild.name} if ctx.guild else None,
+                         'owner_id': self.bot.owner_id})
+            result = await self._wait_done(worker, invocation)
+        finally:
+            del worker.inflight[invocation.id]
+            for message_id in invocation.messages:
+                self.by_message.pop(message_id, None)
+
+        registry.observe('cog_worker', str(worker.worker_id), (ctx.last_sent_at or time.perf_counter()) - start)
+        if result.get('lost'):
+            worker.stats['lost'] += 1
+            await ctx.error('Error', description='Something went wrong running that command, please try again.')
+            return None
+
+        worker.stats['handled'] += 1
+        return result.get('command')
+
+    async def _wait_done(self, worker: WorkerConnection, invocation: RemoteInvocation) -> dict:
+        """ The invocation's result, or {'lost': True} once its worker doesn't say it's still running it """
+        # The gateway doesn't know which command it is, only the worker parses it
+        timeout = max(self.bot.command_deadline, *self.bot.command_deadlines.values()) + INVOCATION_GRACE
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.shield(invocation.done), timeout)
+            except asyncio.TimeoutError:
+                report = await worker.request_stats()
+                # A 'done' sent before the report has been handled by now
+                if invocation.done.done():
+                    return invocation.done.result()
+                if report is None or invocation.id not in report.get('invocations', ()):
+                    return {'lost': True}
+
+    def handle(self, worker: WorkerConnection, message: dict):
+        op = message['op']
+        if op == 'call':
+            self.bot.loop.create_task(self.perform(worker, message))
+        elif op == 'done':
+            invocation = worker.inflight.get(message['id'])
+            if invocation is not None:
+                invocation.finish(message)
+        elif op == 'stats' and worker._stats_reply is not None and not worker._stats_reply.done():
+            worker._stats_reply.set_result(message)
+
+    async def perform(self, worker: WorkerConnection, message: dict):
+        """ Does what a worker's command asked for and sends back the result """
+        reply = {'op': 'result', 'id': message['id'], 'call': message['call']}
+        try:
+            invocation = worker.inflight[message['id']]
+            reply['result'] = await self._perform(invocation, message)
+        except Exception as e:
+            # Whatever went wrong, the worker's command is waiting on this reply
+            if not isinstance(e, (discord.HTTPException, LookupError)):
+                print(f'Cog worker {worker.worker_id} call {message["action"]} failed: {type(e).__name__} {e}')
+            reply['error'] = f'{type(e).__name__}: {e}'
+
+        if worker.connected:
+            worker.send(reply)
+
+    async def _perform(self, invocation: RemoteInvocation, message: dict):
+        action = message['action']
+        if action == 'send':
+            sent = await invocation.ctx.send(message.get('content'), embed=_embed(message.get('embed')),
+                                             delete_after=message.get('delete_after'))
+            invocation.messages[sent.id] = sent
+            self.by_message[sent.id] = invocation
+            return sent.id
+
+        if action == 'typing':
+            return await invocation.ctx.trigger_typing()
+
+        target = invocation.messages[message['message_id']]
+        if action == 'edit':
+            fields = {}
+            if 'content' in message:
+                fields['content'] = message['content']
+            if 'embed' in message:
+                fields['embed'] = _embed(message['embed'])
+            await target.edit(**fields)
+        elif action == 'add_reaction':
+            await target.add_reaction(message['emoji'])
+        elif action == 'remove_reaction':
+            await target.remove_reaction(message['emoji'], discord.Object(id=message['user_id']))
+        elif action == 'clear_reactions':
+            await target.clear_reactions()
+        elif action == 'delete':
+            await target.delete()
+        else:
+            raise LookupError(f'Unknown action {action}')
+
+    async def on_reaction_add(self, reaction, user):
+        invocation = self.by_message.get(reaction.message.id)
+        if invocation is None or user.id == self.bot.user.id or not invocation.worker.connected:
+            return
+
+        invocation.worker.send({'op': 'reaction', 'message_id': reaction.message.id, 'emoji': str(reaction.emoji),
+                                'user': ipc.user_payload(user)})
+
+    async def load(self) -> list:
+        """ [(worker, its own stats report or None)] """
+        reports = await asyncio.gather(*(worker.request_stats() for worker in self.workers))
+        return list(zip(self.workers, reports))
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from collections import Counter
+
+from lxml import etree
+
+from utils.html_stream import Target
+from utils.metrics import registry
+
+
+class SearchEngine:
+    """ A web search scraper: search() returns result links, [] for no results or None if it failed """
+    name = None
+    url = None
+    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 6.1) AppleWebKit/537.36 (KHTML, like Gecko) '
+                             'Chrome/41.0.2228.0 Safari/537.36'}
+
+    def __init__(self, http_client):
+        self.http_client = http_client
+
+    def params(self, query: str) -> dict:
+        return {'q': query}
+
+
+class Ask(SearchEngine):
+    name = 'ask'
+    url = 'http://www.ask.com/web'
+    # A page of results, the download stops after the last one
+    TARGETS = {'links': Target('a.result-link', attr='href', limit=10)}
+
+    def params(self, query: str) -> dict:
+        return {'o': '0', 'qo': 'homepageSearchBox', 'q': query}
+
+    async def search(self, query: str):
+        found = await self.http_client.extract(self.url, self.TARGETS, params=self.params(query),
+                                               headers=self.headers)
+        if found is None:
+            return None
+
+        return [link for link in found['links'] if link and not link.startswith('//')]
+
+
+class Bing(SearchEngine):
+    name = 'bing'
+    url = 'https://www.bing.com/search'
+    headers = {'User-Agent': 'Mozilla/5.0 (compatible; MSIE 9.0; Windows NT 6.1; Trident/4.0; GTB7.4; '
+                             'InfoPath.1; SV1; .NET CLR 2.8.52393; WOW64; en-US)'}
+
+    async def search(self, query: str):
+        html = await self.http_client.get_text(self.url, params=self.params(query), headers=self.headers)
+        if html is None:
+            return None
+
+        with registry.timer('parse', self.name):
+            return self.parse(html)
+
+    @staticmethod
+    def parse(html: str) -> list:
+        root = etree.fromstring(html, etree.HTMLParser())
+        if root is None:
+            return []
+
+        return [link for link in root.xpath('//li[@class="b_algo"]//h2/a/@href') if link.startswith('http')]
+
+
+ENGINES = {engine.name: engine for engine in (Ask, Bing)}
+
+
+class HedgedSearch:
+    """ Searches with several engines, answering with whichever gets results first
+
+    The first engine is asked straight away, and every `hedge_delay` seconds without an answer
+    (or as soon as an engine fails or finds nothing) the next one is asked too. The first
+    non-empty result wins and the searches still running are cancelled, so the slow tail of any
+    one engine is cut off at about `hedge_delay` as long as another one is healthy.
+
+    `stats` counts, per engine, how often it was asked and how each search ended (win, empty,
+    failed, cancelled), and each engine's latency goes into the ('search', name) histogram. """
+
+    def __init__(self, engines: list, hedge_delay: float = 0.5):
+        self.engines = engines
+        self.hedge_delay = hedge_delay
+        self.stats = Counter()
+
+    @classmethod
+    def from_config(cls, http_client, config: dict):
+        """ Builds it from the optional `search` section of the config file """
+        options = config.get('search', {})
+        engines = [ENGINES[name](http_client) for name in options.get('engines', ('ask', 'bing'))]
+
+        return cls(engines, hedge_delay=options.get('hedge_delay', 0.5))
+
+    async def _run(self, engine: SearchEngine, query: str):
+        self.stats[(engine.name, 'asked')] += 1
+        start = time.perf_counter()
+        try:
+            results = await engine.search(query)
+        except asyncio.CancelledError:
+            self.stats[(engine.name, 'cancelled')] += 1
+            raise
+        except Exception as e:
+            print(f'{engine.name} search failed: {type(e).__name__} {e}')
+            results = None
+
+        registry.observe('search', engine.name, time.perf_counter() - start)
+        if results is None:
+            self.stats[(engine.name, 'failed')] += 1
+        elif not results:
+            self.stats[(engine.name, 'empty')] += 1
+
+        return engine, results
+
+    async def search(self, query: str):
+        """ Returns the winning engine's links, [] if every engine found nothing or None if none of them worked """
+        answered = False
+        pending = set()
+        waiting = list(self.engines)
+        try:
+            while waiting or pending:
+                if waiting:
+                    pending.add(asyncio.ensure_future(self._run(waiting.pop(0), query)))
+
+                done, pending = await asyncio.wait(pending, timeout=self.hedge_delay if waiting else None,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    engine, results = task.result()
+                    if results:
+                        self.stats[(engine.name, 'win')] += 1
+                        return results
+                    answered = answered or results is not None
+        finally:
+            for task in pending:
+                task.cancel()
+
+        return [] if answered else None
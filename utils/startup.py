@@ -0,0 +1,65 @@
+import asyncio
+import time
+import traceback
+
+
+class StartupPipeline:
+    """ Runs named async startup stages concurrently
+
+    Each stage starts as soon as the stages it depends on have finished.
+    Stages marked `required=False` may fail without aborting startup; their
+    dependents still run, so they need to cope with the missing result. """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.stages = {}
+        self.timings = {}
+        self.total = 0.0
+
+    def add_stage(self, name: str, func, after=(), required=True):
+        """ Registers `func` (a coroutine function taking no args) under `name` """
+        self.stages[name] = (func, tuple(after), required)
+
+    async def _run_stage(self, name: str, tasks: dict, t0: float):
+        func, after, required = self.stages[name]
+        if after:
+            await asyncio.gather(*(tasks[x] for x in after))
+
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            return await func()
+        except Exception:
+            status = 'failed'
+            if required:
+                raise
+
+            print(f'Startup stage {name} failed:')
+            traceback.print_exc()
+        finally:
+            self.timings[name] = (start - t0, time.perf_counter() - start, status)
+
+    async def run(self) -> dict:
+        """ Runs every stage and returns a dict of stage name -> result """
+        t0 = time.perf_counter()
+        tasks = {}
+        for name in self.stages:
+            tasks[name] = self.loop.create_task(self._run_stage(name, tasks, t0))
+
+        try:
+            results = await asyncio.gather(*tasks.values())
+        finally:
+            self.total = time.perf_counter() - t0
+
+        return dict(zip(tasks, results))
+
+    def report(self) -> str:
+        """ A per-stage timing breakdown, in the order the stages started """
+        width = max([len(x) for x in self.timings] + [5])
+        lines = ['Startup timing:']
+        for name, (offset, duration, status) in sorted(self.timings.items(), key=lambda x: x[1][0]):
+            lines.append(f'  {name:<{width}}  +{offset:.3f}s  {duration:.3f}s  {status}')
+        lines.append(f'  {"total":<{width}}  {self.total:.3f}s '
+                     f'(sequential would be {sum(x[1] for x in self.timings.values()):.3f}s)')
+
+        return '\n'.join(lines)
@@ -0,0 +1,122 @@
+import time
+from collections import deque
+from contextvars import ContextVar
+
+# The trace / span of the command currently running in this task.
+# discord.py runs every on_message in its own task, so these never leak between commands.
+current_trace = ContextVar('current_trace', default=None)
+current_span = ContextVar('current_span', default=None)
+
+# Stop recording spans past this point (pagination loops can go on for a while)
+MAX_SPANS = 200
+
+
+class Span:
+    __slots__ = ('kind', 'name', 'start', 'end', 'children', 'error')
+
+    def __init__(self, kind: str, name: str, start: float = None):
+        self.kind = kind
+        self.name = name
+        self.start = time.perf_counter() if start is None else start
+        self.end = None
+        self.children = []
+        self.error = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+
+class Trace:
+    """ All the spans recorded while one command ran """
+
+    def __init__(self, command: str, start: float):
+        self.command = command
+        self.root = Span('command', command, start)
+        self.num_spans = 0
+        self.created = time.time()
+
+    def finish(self, end: float = None):
+        self.root.end = time.perf_counter() if end is None else end
+
+    def render(self, width: int = 24) -> str:
+        """ Renders a text waterfall, one line per span, offsets and durations in ms """
+        total = max(self.root.duration, 1e-9)
+        lines = [f'{self.command}  total {total * 1000:.1f}ms']
+
+        def walk(span, depth):
+            offset = span.start - self.root.start
+            bar_start = int(offset / total * width)
+            bar_len = max(1, int(span.duration / total * width))
+            bar = ' ' * bar_start + '#' * min(bar_len, width - bar_start)
+            label = f'{"  " * depth}{span.kind} {span.name}'
+            if span.error:
+                label += f' !{span.error}'
+            lines.append(f'+{offset * 1000:8.1f} {span.duration * 1000:8.1f} |{bar:<{width}}| {label}')
+
+            for child in span.children:
+                walk(child, depth + 1)
+
+        for child in self.root.children:
+            walk(child, 0)
+
+        return '\n'.join(lines)
+
+
+class Tracer:
+    """ Keeps the most recently finished traces in a ring buffer """
+
+    def __init__(self, maxlen: int = 500):
+        self.finished = deque(maxlen=maxlen)
+
+    def start(self, command: str, start: float) -> Trace:
+        trace = Trace(command, start)
+        current_trace.set(trace)
+        current_span.set(trace.root)
+
+        return trace
+
+    def finish(self, trace: Trace, end: float = None):
+        trace.finish(end)
+        self.finished.append(trace)
+
+    def last(self, command: str = None):
+        """ The most recent trace (of `command`, if given) """
+        for trace in reversed(self.finished):
+            if command is None or trace.command == command:
+                return trace
+
+        return None
+
+
+def start_span(kind: str, name: str):
+    """ Opens a child span of the current span -- returns (span, token) or None outside a command """
+    parent = current_span.get()
+    trace = current_trace.get()
+    if parent is None or trace.num_spans >= MAX_SPANS:
+        return None
+
+    span = Span(kind, name)
+    parent.children.append(span)
+    trace.num_spans += 1
+
+    return span, current_span.set(span)
+
+
+def end_span(started, error: BaseException = None):
+    if started is None:
+        return
+
+    span, token = started
+    span.end = time.perf_counter()
+    if error is not None:
+        span.error = type(error).__name__
+
+    try:
+        current_span.reset(token)
+    except ValueError:
+        # Ended from a different context than it started in (e.g. aiohttp trace callbacks)
+        pass
+
+
+tracer = Tracer()
@@ -0,0 +1,88 @@
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+from utils.metrics import Histogram, registry
+
+
+class Stall:
+    """ One occasion where the event loop was blocked for longer than the threshold """
+    __slots__ = ('when', 'lag', 'stack')
+
+    def __init__(self, when: float, lag: float, stack: list):
+        self.when = when
+        self.lag = lag
+        self.stack = stack
+
+    @property
+    def hotspot(self) -> str:
+        """ The innermost frame of our own code, which is usually the blocking call site """
+        for frame in reversed(self.stack):
+            if 'site-packages' not in frame.filename and 'lib/python' not in frame.filename:
+                return f'{frame.filename}:{frame.lineno} in {frame.name}'
+
+        frame = self.stack[-1]
+        return f'{frame.filename}:{frame.lineno} in {frame.name}'
+
+    def format(self, limit: int = 12) -> str:
+        return ''.join(traceback.format_list(self.stack[-limit:]))
+
+
+class LoopWatchdog(threading.Thread):
+    """ Measures event loop lag from a separate thread
+
+    Every `interval` seconds a no-op callback is scheduled on the loop. If it hasn't run after
+    `threshold` seconds the loop is blocked, so the loop thread's Python stack is captured right
+    then -- while whatever is blocking it is still on the stack. """
+
+    def __init__(self, loop, interval: float = 0.5, threshold: float = 0.1, maxlen: int = 100):
+        super().__init__(name='loop-watchdog', daemon=True)
+        self.loop = loop
+        self.interval = interval
+        self.threshold = threshold
+        self.loop_thread_id = None
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = deque(maxlen=maxlen)
+        self.hotspots = Counter()
+        self._stop_event = threading.Event()
+        # Created here (on the loop thread) so the registry dict is never resized from this thread
+        self.histogram = registry.histograms.setdefault(('loop', 'lag'), Histogram())
+
+    def _ping(self, done: threading.Event):
+        self.loop_thread_id = threading.get_ident()
+        done.set()
+
+    def capture_stack(self):
+        frame = sys._current_frames().get(self.loop_thread_id)
+        return traceback.extract_stack(frame) if frame is not None else None
+
+    def run(self):
+        while not self._stop_event.is_set():
+            done = threading.Event()
+            sent = time.perf_counter()
+            self.loop.call_soon_threadsafe(self._ping, done)
+
+            stack = None
+            if not done.wait(self.threshold):
+                stack = self.capture_stack()
+                # Keep waiting (in slices, so stop() still works) until the loop comes back
+                while not done.wait(1.0) and not self._stop_event.is_set():
+                    pass
+
+            lag = time.perf_counter() - sent
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.histogram.observe(lag)
+
+            if stack:
+                stall = Stall(time.time(), lag, stack)
+                self.stalls.append(stall)
+                self.hotspots[stall.hotspot] += 1
+
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
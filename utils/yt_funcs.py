@@ -2,7 +2,7 @@ import requests
 import json
 
 
-def get_video_info(query: str, title_append='', num_results=1, thumb_quality=0) -> dict:
+def get_video_info(query: str, title_append='', num_results=1, thumb_quality=0, api_key=None) -> dict:
     """
     Retrives video ID from the youtube API
 
@@ -15,11 +15,15 @@ def get_video_info(query: str, title_append='', num_results=1, thumb_quality=0)
     num_results: int 1 - 5 (youtube gives 5 results per page)
 
     thumb_quality: 0 - 2 (highest to lowest quality)
+
+    api_key: youtube API key, read from data/apikeys.json if not supplied
     """
 
     # Initial setup -> API key
-    with open('data/apikeys.json') as f:
-        yt_api_key = json.load(f)['youtube']
+    if api_key is None:
+        with open('data/apikeys.json') as f:
+            api_key = json.load(f)['youtube']
+    yt_api_key = api_key
 
     # Base URL
     api_uri = 'https://www.googleapis.com/youtube/v3/search?part=snippet&q={}&type=video&key={}'